@@ -0,0 +1,55 @@
+from ingestao import concatenar_blocos
+
+# Dimensões do cubo de contagens (MES_DESCRICAO entra quando existe no arquivo)
+DIMENSOES_CUBO = ["DATA_FATO", "SETOR", "UNID_REGISTRO_NIVEL_6", "CODIGO_NATUREZA_PRINCIPAL", "MES_DESCRICAO"]
+
+
+# Função para montar o cubo de contagens por (data, setor, unidade, natureza), uma vez por conjunto de dados
+def construir_cubo(df):
+    dimensoes = [coluna for coluna in DIMENSOES_CUBO if coluna in df.columns]
+    cubo = df.groupby(dimensoes, observed=True, dropna=False).size().reset_index(name="QUANTIDADE")
+    cubo["QUANTIDADE"] = cubo["QUANTIDADE"].astype("int32")
+    return cubo
+
+
+# Função para atualizar o cubo com novas ocorrências sem recontar as antigas
+def anexar_ao_cubo(cubo, novos):
+    juntos = concatenar_blocos([cubo, construir_cubo(novos)])
+    dimensoes = [coluna for coluna in juntos.columns if coluna != "QUANTIDADE"]
+    cubo = juntos.groupby(dimensoes, observed=True, dropna=False)["QUANTIDADE"].sum().reset_index()
+    cubo["QUANTIDADE"] = cubo["QUANTIDADE"].astype("int32")
+    return cubo
+
+
+# Função para medir a memória ocupada pelo cubo
+def bytes_cubo(cubo):
+    return int(cubo.memory_usage(index=False, deep=True).sum())
+
+
+# Função para recortar o cubo pelas seleções ({coluna: lista de valores}; vazio não filtra)
+def recortar(cubo, selecoes):
+    mascara = None
+    for coluna, valores in selecoes.items():
+        if not valores:
+            continue
+        condicao = cubo[coluna].isin(valores)
+        mascara = condicao if mascara is None else mascara & condicao
+    return cubo if mascara is None else cubo[mascara]
+
+
+# Função para contar as ocorrências por uma coluna, do maior para o menor (equivale ao value_counts)
+def contagem_por(cubo, coluna, selecoes=None):
+    recorte = recortar(cubo, selecoes or {})
+    contagem = recorte.groupby(coluna, observed=True)["QUANTIDADE"].sum()
+    contagem = contagem[contagem > 0].sort_values(ascending=False, kind="stable")
+    return contagem.reset_index()
+
+
+# Função para contar as ocorrências por dia (e, com por, por dia e valor dessa coluna)
+def serie_diaria(cubo, selecoes=None, por=None):
+    recorte = recortar(cubo, selecoes or {})
+    chaves = ["DATA_FATO"] if por is None else [por, "DATA_FATO"]
+    serie = recorte.groupby(chaves, observed=True)["QUANTIDADE"].sum()
+    if por is not None:
+        serie = serie[serie > 0]
+    return serie.reset_index().rename(columns={"DATA_FATO": "DATA"})
@@ -1,8 +1,21 @@
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+from ingestao import ler_csv, ler_varios_csv
+from mapas import criar_mapa, criar_mapa_grade, FORMAS_GRADE
+from limites import ARQUIVO_LIMITES_PADRAO, carregar_limites, juntar_setores, resumo_divergencias
+from hotspots import METODOS_HOTSPOT, CELULA_PADRAO_M, BANDA_PADRAO_M, calcular_hotspots, criar_mapa_hotspots, principais_hotspots
+from armazem_dados import ArmazemDados, bytes_aproximados, identificador_conteudo
+from cache_disco import CacheDisco
+from cache_render import CacheRender, DIRETORIO_RENDER_PADRAO
+from indices import opcoes, filtrar
+from agregados import contagem_por, serie_diaria
+from series_temporais import FREQUENCIAS, figura_serie
+from conjunto_dados import ConjuntoDados, identificador_conjunto
+from registro_conjuntos import RegistroConjuntos
+from instrumentacao import etapa, iniciar_execucao, finalizar_execucao, medir_memoria, tabela_historico
 
 # Configuração da página
 st.set_page_config(
@@ -10,41 +23,185 @@ st.set_page_config(
     layout="wide",
 )
 
+# Cache local em disco dos arquivos já processados
+cache_disco = CacheDisco()
+
+# Resultados intermediários (opções dos filtros, dados filtrados, agregações e figuras) guardados por
+# (etapa, conjunto de dados, filtros), com descarte LRU: trocar de página ou voltar a um filtro já usado
+# reaproveita o que já foi calculado. O conjunto é identificado pelo conteúdo, então o armazém pode ser
+# compartilhado entre as sessões
+ORCAMENTO_ETAPAS_BYTES = 256 * 1024 ** 2
+
+@st.cache_resource
+def armazem_etapas():
+    return ArmazemDados(ORCAMENTO_ETAPAS_BYTES, medir=bytes_aproximados)
+
+# Função para obter o resultado de uma etapa já calculado ou calculá-lo (e medi-lo) agora
+def memorizado(nome, chave, calcular):
+    def calcular_e_medir():
+        with etapa(nome) as registro:
+            resultado = calcular()
+            registro["linhas_saida"] = len(resultado) if isinstance(resultado, pd.DataFrame) else None
+        return resultado
+    return armazem_etapas().obter_ou_carregar((nome,) + chave, calcular_e_medir)
+
+# Mapas já renderizados (HTML), compartilhados entre as sessões; os descartados da memória vão para o disco
+@st.cache_resource
+def cache_render():
+    return CacheRender(diretorio=DIRETORIO_RENDER_PADRAO)
+
+# Função para exibir um mapa pelo HTML guardado para a chave (conjunto de dados, filtros, opções do mapa)
+# montar() devolve o mapa Folium e só é chamada (e o mapa serializado) quando o HTML ainda não existe
+def exibir_mapa(nome, chave, montar):
+    def renderizar():
+        with etapa(nome):
+            mapa = montar()
+        with etapa("serializar"):
+            return mapa.get_root().render()
+    _, _, html_mapa = cache_render().obter_ou_renderizar((nome,) + chave, renderizar)
+    # Mesmo tamanho do folium_static
+    components.html(html_mapa, height=510, width=700)
+
+# Conjuntos de dados montados, compartilhados por todas as sessões: cada conteúdo fica uma única vez
+# em memória e as sessões recebem o mesmo objeto (sem a cópia por sessão do st.cache_data)
+@st.cache_resource
+def registro_conjuntos():
+    return RegistroConjuntos()
+
 # Função para carregar e validar dados
-@st.cache_data  # Atualizado para usar st.cache_data
-def carregar_dados(arquivo):
-    df = pd.read_csv(arquivo, delimiter=';')
-    
-    # Verifica se as colunas necessárias estão presentes
-    colunas_necessarias = {"LATITUDE", "LONGITUDE", "DATA_FATO", "CODIGO_NATUREZA_PRINCIPAL", "SETOR", "UNID_REGISTRO_NIVEL_6"}
-    if not colunas_necessarias.issubset(df.columns):
-        st.error("O arquivo CSV deve conter as colunas necessárias: LATITUDE, LONGITUDE, DATA_FATO, CODIGO_NATUREZA_PRINCIPAL, SETOR e UNID_REGISTRO_NIVEL_6.")
+def carregar_dados(dataset_id, _arquivo):
+    # Arquivo já processado antes (mesmo em outra execução do servidor): lê do cache em disco
+    df = cache_disco.obter(dataset_id)
+    if df is not None:
+        return df
+
+    # Leitura em blocos (ou em paralelo, para arquivos grandes): só as colunas necessárias
+    # e só os crimes violentos ficam em memória
+    barra = st.sidebar.progress(0.0, text="Carregando arquivo...")
+
+    def atualizar_progresso(fracao, linhas_lidas):
+        if fracao is not None:
+            barra.progress(fracao, text=f"Carregando arquivo... {linhas_lidas:,} linhas lidas")
+
+    try:
+        df = ler_csv(_arquivo, progresso=atualizar_progresso)
+    except ValueError as erro:
+        st.error(str(erro))
         return None
-    
-    # Filtra apenas os crimes violentos
-    naturezas_crimes_violentos = {"B01121", "B02001", "B01148", "C01157", "C01158", "D01213", "D01217", "C01159"}
-    df = df[df["CODIGO_NATUREZA_PRINCIPAL"].isin(naturezas_crimes_violentos)]
-    
-    # Converte DATA_FATO para datetime
-    df["DATA_FATO"] = pd.to_datetime(df["DATA_FATO"], format="%d/%m/%Y", errors="coerce")
-    
-    # Limpa e converte LATITUDE e LONGITUDE para valores numéricos
-    df["LATITUDE"] = pd.to_numeric(df["LATITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    df["LONGITUDE"] = pd.to_numeric(df["LONGITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    
-    # Remove linhas com valores inválidos
-    df = df.dropna(subset=["LATITUDE", "LONGITUDE", "DATA_FATO"])
-    
-    return df
+    finally:
+        barra.empty()
+
+    return cache_disco.guardar(dataset_id, df)
+
+# Função para processar em paralelo os arquivos que ainda não estão no cache em disco
+def preprocessar_em_paralelo(ids, arquivos):
+    faltantes = [(dataset_id, arquivo) for dataset_id, arquivo in zip(ids, arquivos) if not cache_disco.contem(dataset_id)]
+    if len(faltantes) < 2:
+        return
+    barra = st.sidebar.progress(0.0, text="Processando arquivos...")
+    try:
+        lidos = ler_varios_csv(
+            [arquivo for _, arquivo in faltantes],
+            progresso=lambda fracao, concluidos: barra.progress(fracao, text=f"Processando arquivos... {concluidos}/{len(faltantes)}"),
+        )
+    except ValueError:
+        # O erro é mostrado por carregar_dados ao processar o arquivo com problema
+        return
+    finally:
+        barra.empty()
+    for (dataset_id, _), df in zip(faltantes, lidos):
+        cache_disco.guardar(dataset_id, df)
+
+# Função para montar o conjunto de dados dos arquivos enviados, ou obtê-lo do registro se outra sessão
+# já o montou. Ao acrescentar um arquivo (ex.: o mês novo), só ele é processado e anexado ao conjunto da sessão
+def montar_conjunto(arquivos):
+    # O hash do conteúdo é calculado uma vez por upload (file_id do uploader), não a cada nova execução do script;
+    # só os uploads atuais ficam na sessão
+    ids_upload = st.session_state.get("ids_upload", {})
+    ids_upload = {
+        arquivo.file_id: ids_upload.get(arquivo.file_id) or identificador_conteudo(arquivo.getvalue())
+        for arquivo in arquivos
+    }
+    st.session_state["ids_upload"] = ids_upload
+    # Arquivos repetidos entram uma vez; identificador e arquivo são deduplicados juntos
+    pares = dict(zip((ids_upload[arquivo.file_id] for arquivo in arquivos), arquivos))
+    ids, arquivos = list(pares), list(pares.values())
+    chave = identificador_conjunto(ids)
+    referencia = st.session_state.get("referencia_conjunto")
+    if referencia is not None and referencia.dataset_id == chave:
+        return referencia.conjunto
+
+    def montar():
+        preprocessar_em_paralelo(ids, arquivos)
+        # Só reaproveita o conjunto da sessão se os arquivos dele vierem primeiro, na mesma ordem:
+        # assim o mesmo identificador sempre corresponde às mesmas linhas, em qualquer sessão
+        conjunto = referencia.conjunto if referencia is not None else None
+        if conjunto is not None and list(conjunto.arquivos) != ids[:len(conjunto.arquivos)]:
+            conjunto = None  # Algum arquivo foi removido ou reordenado: recomeça a partir dos caches
+        for dataset_id, arquivo in zip(ids, arquivos):
+            if conjunto is not None and dataset_id in conjunto.arquivos:
+                continue
+            df = carregar_dados(dataset_id, arquivo)
+            if df is None:
+                return None
+            try:
+                conjunto = ConjuntoDados.de_arquivo(dataset_id, df) if conjunto is None else conjunto.anexar(dataset_id, df)
+            except ValueError as erro:
+                st.error(str(erro))
+                return None
+        return conjunto
+
+    nova = registro_conjuntos().adquirir(chave, montar)
+    if nova is None:
+        return None
+    # A sessão deixa de usar o conjunto anterior; sem outras sessões, ele pode ser descartado
+    if referencia is not None:
+        referencia.liberar()
+    st.session_state["referencia_conjunto"] = nova
+    return nova.conjunto
+
+# Função para identificar o arquivo de limites (enviado ou ANALISE_CV_LIMITES) sem refazer o hash a cada execução:
+# o identificador fica na sessão, pelo file_id do upload ou pelo caminho e data de modificação do arquivo padrão
+# Retorna (identificador, ler); ler() devolve o conteúdo e só é chamada quando os limites precisam ser lidos
+def identificar_limites(arquivo):
+    if arquivo is not None:
+        origem, ler = ("upload", arquivo.file_id), arquivo.getvalue
+    else:
+        origem = ("arquivo", ARQUIVO_LIMITES_PADRAO, os.path.getmtime(ARQUIVO_LIMITES_PADRAO))
+
+        def ler():
+            with open(ARQUIVO_LIMITES_PADRAO, "rb") as handle:
+                return handle.read()
+    ids_limites = st.session_state.get("ids_limites", {})
+    if origem not in ids_limites:
+        # Só o arquivo atual fica na sessão
+        ids_limites = {origem: identificador_conteudo(ler())}
+        st.session_state["ids_limites"] = ids_limites
+    return ids_limites[origem], ler
 
 # Layout principal
 st.sidebar.title("Navegação")
 pagina = st.sidebar.radio("Escolha uma página", ["Introdução", "Análise por Local", "Análise por Tempo", "Análise por Tipo de Crime"])
+iniciar_execucao(f"app.py:{pagina}")
 
 # Upload de arquivo
 st.sidebar.title("Upload de Arquivo")
-arquivo = st.sidebar.file_uploader("Faça upload do arquivo CSV", type=["csv"])
-dados = carregar_dados(arquivo) if arquivo else None
+arquivos = st.sidebar.file_uploader("Faça upload dos arquivos CSV (um ou mais meses)", type=["csv"], accept_multiple_files=True)
+arquivo_limites = st.sidebar.file_uploader("Limites dos setores (GeoJSON, opcional)", type=["geojson", "json"])
+with etapa("carregar") as registro:
+    conjunto = montar_conjunto(arquivos) if arquivos else None
+    registro["linhas_saida"] = len(conjunto.dados) if conjunto is not None else None
+dados = conjunto.dados if conjunto is not None else None
+dataset_id = conjunto.dataset_id if conjunto is not None else None
+if conjunto is not None:
+    compartilhados = registro_conjuntos().estatisticas()
+    st.sidebar.caption(
+        f"Conjuntos no servidor: {compartilhados['conjuntos']} ({compartilhados['bytes'] / 1024 ** 2:,.0f} MB); "
+        f"sessões usando este: {registro_conjuntos().referencias(dataset_id)}"
+    )
+if dados is not None and "bytes_por_linha" in dados.attrs:
+    memoria = dados.attrs["bytes_por_linha"]
+    st.sidebar.caption(f"Memória por linha: {memoria['antes']:.0f} B → {memoria['depois']:.0f} B")
 
 # Introdução
 if pagina == "Introdução":
@@ -59,73 +216,163 @@ if pagina == "Introdução":
         Faça o upload de um arquivo CSV contendo os dados para começar.
     """)
 
-# Filtros globais
+# Filtros globais (as opções são calculadas uma vez por conjunto de dados)
 if dados is not None:
-    setores = st.sidebar.multiselect("Selecione Setores", options=["Todos"] + dados["SETOR"].dropna().unique().tolist(), default="Todos")
-    unidades = st.sidebar.multiselect("Selecione Unidades (UNID_REGISTRO_NIVEL_6)", options=["Todos"] + dados["UNID_REGISTRO_NIVEL_6"].dropna().unique().tolist(), default="Todos")
-    
-    # Aplica os filtros
-    if "Todos" not in setores:
-        dados = dados[dados["SETOR"].isin(setores)]
-    if "Todos" not in unidades:
-        dados = dados[dados["UNID_REGISTRO_NIVEL_6"].isin(unidades)]
+    indices = conjunto.indices
+    cubo = conjunto.cubo
+    opcoes_setor = memorizado("opcoes_setor", (dataset_id,), lambda: ["Todos"] + opcoes(indices, "SETOR"))
+    opcoes_unidade = memorizado("opcoes_unidade", (dataset_id,), lambda: ["Todos"] + opcoes(indices, "UNID_REGISTRO_NIVEL_6"))
+    setores = st.sidebar.multiselect("Selecione Setores", options=opcoes_setor, default="Todos")
+    unidades = st.sidebar.multiselect("Selecione Unidades (UNID_REGISTRO_NIVEL_6)", options=opcoes_unidade, default="Todos")
+    selecoes = {
+        "SETOR": [] if "Todos" in setores else setores,
+        "UNID_REGISTRO_NIVEL_6": [] if "Todos" in unidades else unidades,
+    }
+    chave_filtros = (dataset_id,) + tuple((coluna, tuple(sorted(valores))) for coluna, valores in selecoes.items())
+
+    # Os filtros só são aplicados às linhas nas páginas que usam as ocorrências (mapas)
+    def dados_filtrados():
+        # Sem filtros são as próprias ocorrências do conjunto: guardá-las no armazém ocuparia o orçamento
+        # com uma cópia medida no tamanho total e descartaria as outras etapas
+        if not any(selecoes.values()):
+            return dados
+        return memorizado("filtrar", chave_filtros, lambda: filtrar(dados, indices, selecoes))
 
 # Página 1: Análise por Local
 if pagina == "Análise por Local" and dados is not None:
     st.title("Análise por Local")
     
     st.subheader("Gráfico de Barras: Crimes por Região")
-    barra_local = dados["SETOR"].value_counts().reset_index(name="QUANTIDADE")
-    barra_local.rename(columns={"index": "SETOR"}, inplace=True)  # Renomeia a coluna index para SETOR
-    fig_barra = px.bar(barra_local, x="SETOR", y="QUANTIDADE", labels={"SETOR": "Setor", "QUANTIDADE": "Quantidade"})
-    st.plotly_chart(fig_barra)
+    barra_local = memorizado("agregar_setor", chave_filtros, lambda: contagem_por(cubo, "SETOR", selecoes))
+    fig_barra = memorizado("figura_barras_setor", chave_filtros, lambda: px.bar(
+        barra_local, x="SETOR", y="QUANTIDADE", labels={"SETOR": "Setor", "QUANTIDADE": "Quantidade"}))
+    with etapa("serializar"):
+        st.plotly_chart(fig_barra)
     
     st.subheader("Gráfico de Pizza: Distribuição de Crimes por Setor")
-    fig_pizza = px.pie(barra_local, names="SETOR", values="QUANTIDADE")
-    st.plotly_chart(fig_pizza)
+    fig_pizza = memorizado("figura_pizza_setor", chave_filtros, lambda: px.pie(barra_local, names="SETOR", values="QUANTIDADE"))
+    with etapa("serializar"):
+        st.plotly_chart(fig_pizza)
     
     st.subheader("Mapa Interativo")
-    mapa = folium.Map(location=[dados["LATITUDE"].mean(), dados["LONGITUDE"].mean()], zoom_start=12)
-    for _, row in dados.iterrows():
-        folium.Marker([row["LATITUDE"], row["LONGITUDE"]], popup=row["CODIGO_NATUREZA_PRINCIPAL"]).add_to(mapa)
-    folium_static(mapa)
+    modo_mapa = st.radio("Modo do mapa", ["Pontos"] + FORMAS_GRADE, horizontal=True,
+                         format_func=lambda modo: {"Pontos": "Pontos", "quadrado": "Grade quadrada", "hexagono": "Grade hexagonal"}[modo])
+    if modo_mapa != "Pontos":
+        zoom = st.slider("Nível de zoom (define o tamanho da célula)", min_value=8, max_value=16, value=12)
+    dados = dados_filtrados()
+    if modo_mapa == "Pontos":
+        exibir_mapa("mapa", chave_filtros, lambda: criar_mapa(dados))
+    else:
+        exibir_mapa("mapa_grade", chave_filtros + (modo_mapa, zoom), lambda: criar_mapa_grade(dados, chave_filtros, zoom=zoom, forma=modo_mapa))
+
+    st.subheader("Hotspots")
+    metodo = st.radio("Método", METODOS_HOTSPOT, horizontal=True,
+                      format_func=lambda metodo: {"kde": "Densidade (KDE)", "gi": "Getis-Ord Gi*"}[metodo])
+    naturezas = st.multiselect("Naturezas (vazio: todas)", options=opcoes(indices, "CODIGO_NATUREZA_PRINCIPAL"))
+    data_minima, data_maxima = dados["DATA_FATO"].min(), dados["DATA_FATO"].max()
+    periodo = st.date_input("Período", value=(data_minima, data_maxima), min_value=data_minima, max_value=data_maxima) if len(dados) else ()
+    celula_m = st.slider("Tamanho da célula (m)", min_value=100, max_value=1000, value=CELULA_PADRAO_M, step=50)
+    banda_m = st.slider("Raio da vizinhança (m)", min_value=100, max_value=3000, value=BANDA_PADRAO_M, step=100)
+    inicio, fim = (tuple(periodo) + (None, None))[:2] if len(dados) else (None, None)
+    parametros = (metodo, tuple(sorted(naturezas)), str(inicio), str(fim), celula_m, banda_m)
+    grade, superficie = memorizado("hotspots", chave_filtros + parametros, lambda: calcular_hotspots(
+        dados, metodo, celula_m, banda_m, naturezas, inicio, fim))
+    if grade is None:
+        st.info("Nenhuma ocorrência para os filtros escolhidos.")
+    else:
+        exibir_mapa("mapa_hotspots", chave_filtros + parametros, lambda: criar_mapa_hotspots(dados, grade, superficie, metodo))
+        st.caption("Células mais quentes" + (" (VALOR: z-score do Gi*)" if metodo == "gi" else " (VALOR: ocorrências por km²)"))
+        st.dataframe(principais_hotspots(grade, superficie))
+
+    # Junção espacial com os limites dos setores (arquivo enviado ou ANALISE_CV_LIMITES): uma vez por conjunto e arquivo
+    juncao_setores = None
+    if arquivo_limites is not None or ARQUIVO_LIMITES_PADRAO:
+        try:
+            id_limites, ler_limites = identificar_limites(arquivo_limites)
+            limites = memorizado("carregar_limites", (id_limites,), lambda: carregar_limites(ler_limites()))
+            # juntar_setores registra a própria etapa; a junção é feita com todas as ocorrências do conjunto
+            juncao_setores = armazem_etapas().obter_ou_carregar(
+                ("juntar_setores", dataset_id, id_limites), lambda: juntar_setores(conjunto.dados, limites))
+        except (OSError, ValueError) as erro:
+            st.sidebar.error(f"Erro nos limites dos setores: {erro}")
+
+    if juncao_setores is not None:
+        st.subheader("Conferência de Setores pelos Limites")
+        juncao = juncao_setores.loc[dados.index]
+        divergentes = int(juncao["SETOR_DIVERGENTE"].sum())
+        st.markdown(f"**{divergentes:,}** de {len(juncao):,} ocorrências estão fora do setor registrado (ou fora de todos os limites).")
+        chave_limites = chave_filtros + (id_limites,)
+        st.dataframe(memorizado("resumo_divergencias", chave_limites, lambda: resumo_divergencias(dados, juncao)).head(50))
+        por_setor_geo = memorizado("agregar_setor_geo", chave_limites, lambda: juncao["SETOR_GEO"].value_counts()
+                                   .rename_axis("SETOR_GEO").reset_index(name="QUANTIDADE"))
+        fig_setor_geo = memorizado("figura_barras_setor_geo", chave_limites, lambda: px.bar(
+            por_setor_geo, x="SETOR_GEO", y="QUANTIDADE", labels={"SETOR_GEO": "Setor pelos limites", "QUANTIDADE": "Quantidade"}))
+        with etapa("serializar"):
+            st.plotly_chart(fig_setor_geo)
 
 # Página 2: Análise por Tempo
 if pagina == "Análise por Tempo" and dados is not None:
     st.title("Análise por Tempo")
     
     st.subheader("Gráfico de Barras: Crimes por Mês")
-    barra_tempo = dados["MES_DESCRICAO"].value_counts().reset_index(name="QUANTIDADE")
-    barra_tempo.rename(columns={"index": "MES_DESCRICAO"}, inplace=True)
-    fig_barra_tempo = px.bar(barra_tempo, x="MES_DESCRICAO", y="QUANTIDADE", labels={"MES_DESCRICAO": "Mês", "QUANTIDADE": "Quantidade"})
-    st.plotly_chart(fig_barra_tempo)
+    barra_tempo = memorizado("agregar_mes", chave_filtros, lambda: contagem_por(cubo, "MES_DESCRICAO", selecoes))
+    fig_barra_tempo = memorizado("figura_barras_mes", chave_filtros, lambda: px.bar(
+        barra_tempo, x="MES_DESCRICAO", y="QUANTIDADE", labels={"MES_DESCRICAO": "Mês", "QUANTIDADE": "Quantidade"}))
+    with etapa("serializar"):
+        st.plotly_chart(fig_barra_tempo)
     
     st.subheader("Gráfico de Linha: Evolução dos Crimes")
-    evolucao_tempo = dados.groupby(dados["DATA_FATO"].dt.date).size().reset_index(name="QUANTIDADE")
-    evolucao_tempo.rename(columns={"DATA_FATO": "DATA"}, inplace=True)
-    fig_linha_tempo = px.line(evolucao_tempo, x="DATA", y="QUANTIDADE", labels={"DATA": "Data", "QUANTIDADE": "Crimes"})
-    st.plotly_chart(fig_linha_tempo)
+    separar_setores = st.checkbox("Uma linha por setor")
+    por = "SETOR" if separar_setores else None
+    evolucao_tempo = memorizado("agregar_serie", chave_filtros + (por,), lambda: serie_diaria(cubo, selecoes, por=por))
+    if not evolucao_tempo.empty:
+        # A frequência (dia/semana/mês) acompanha o intervalo selecionado, salvo escolha manual
+        data_inicial, data_final = evolucao_tempo["DATA"].min().date(), evolucao_tempo["DATA"].max().date()
+        if data_inicial < data_final:
+            data_inicial, data_final = st.slider("Intervalo", min_value=data_inicial, max_value=data_final,
+                                                 value=(data_inicial, data_final), format="DD/MM/YYYY")
+        frequencia = st.radio("Agrupar por", ["Automático"] + list(FREQUENCIAS), horizontal=True)
+
+        def figura_linha():
+            no_intervalo = evolucao_tempo["DATA"].between(pd.Timestamp(data_inicial), pd.Timestamp(data_final))
+            return figura_serie(
+                evolucao_tempo[no_intervalo],
+                frequencia=None if frequencia == "Automático" else frequencia,
+                por=por,
+            )
+
+        fig_linha_tempo, frequencia = memorizado("figura_serie", chave_filtros + (por, data_inicial, data_final, frequencia), figura_linha)
+        st.caption(f"Série por {frequencia.lower()}")
+        with etapa("serializar"):
+            st.plotly_chart(fig_linha_tempo)
 
 # Página 3: Análise por Tipo de Crime
 if pagina == "Análise por Tipo de Crime" and dados is not None:
     st.title("Análise por Tipo de Crime")
     
     st.subheader("Gráfico de Barras: Ocorrências por Tipo de Crime")
-    barra_tipo = dados["CODIGO_NATUREZA_PRINCIPAL"].value_counts().reset_index(name="QUANTIDADE")
-    barra_tipo.rename(columns={"index": "CODIGO_NATUREZA_PRINCIPAL"}, inplace=True)
-    fig_barra_tipo = px.bar(barra_tipo, x="CODIGO_NATUREZA_PRINCIPAL", y="QUANTIDADE", labels={"CODIGO_NATUREZA_PRINCIPAL": "Tipo de Crime", "QUANTIDADE": "Quantidade"})
-    st.plotly_chart(fig_barra_tipo)
+    barra_tipo = memorizado("agregar_natureza", chave_filtros, lambda: contagem_por(cubo, "CODIGO_NATUREZA_PRINCIPAL", selecoes))
+    fig_barra_tipo = memorizado("figura_barras_natureza", chave_filtros, lambda: px.bar(
+        barra_tipo, x="CODIGO_NATUREZA_PRINCIPAL", y="QUANTIDADE", labels={"CODIGO_NATUREZA_PRINCIPAL": "Tipo de Crime", "QUANTIDADE": "Quantidade"}))
+    with etapa("serializar"):
+        st.plotly_chart(fig_barra_tipo)
     
     st.subheader("Gráfico de Pizza: Distribuição por Tipo de Crime")
-    fig_pizza_tipo = px.pie(barra_tipo, names="CODIGO_NATUREZA_PRINCIPAL", values="QUANTIDADE")
-    st.plotly_chart(fig_pizza_tipo)
+    fig_pizza_tipo = memorizado("figura_pizza_natureza", chave_filtros, lambda: px.pie(barra_tipo, names="CODIGO_NATUREZA_PRINCIPAL", values="QUANTIDADE"))
+    with etapa("serializar"):
+        st.plotly_chart(fig_pizza_tipo)
     
     st.subheader("Mapa Interativo")
-    mapa_tipo = folium.Map(location=[dados["LATITUDE"].mean(), dados["LONGITUDE"].mean()], zoom_start=12)
-    for _, row in dados.iterrows():
-        folium.Marker([row["LATITUDE"], row["LONGITUDE"]], popup=row["CODIGO_NATUREZA_PRINCIPAL"]).add_to(mapa_tipo)
-    folium_static(mapa_tipo)
+    dados = dados_filtrados()
+    exibir_mapa("mapa", chave_filtros, lambda: criar_mapa(dados))
 
 # Mensagem caso não tenha dados carregados
 if dados is None and pagina != "Introdução":
     st.warning("Por favor, faça o upload de um arquivo CSV para visualizar as análises.")
+
+# Painel de instrumentação: tempo, linhas e pico de memória de cada etapa das últimas execuções
+finalizar_execucao()
+if st.sidebar.checkbox("Mostrar instrumentação"):
+    medir_memoria(st.sidebar.checkbox("Medir pico de memória (mais lento)"))
+    with st.sidebar.expander("Etapas das últimas execuções", expanded=True):
+        st.dataframe(pd.DataFrame(tabela_historico()), hide_index=True)
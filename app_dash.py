@@ -1,50 +1,84 @@
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ClientsideFunction, ctx, no_update
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import plotly.express as px
-import folium
 from dash import Dash
 import dash_bootstrap_components as dbc
-import io
-import base64  # Corrigido: Importação adicionada
+import json
+import os
+from urllib.parse import urlencode
+from flask import Response, abort, request
+from ingestao import ler_csv, ler_varios_csv
+from mapas import centro_mapa, criar_mapa, criar_mapa_grade, criar_mapa_tiles
+from armazem_dados import ArmazemDados, bytes_aproximados
+from upload import decodificar_upload
+from cache_disco import CacheDisco
+from cache_render import CacheRender, DIRETORIO_RENDER_PADRAO
+from indices import opcoes, filtrar
+from agregados import contagem_por
+from conjunto_dados import ConjuntoDados, identificador_conjunto
+from instrumentacao import etapa, execucao, tabela_historico
+from tarefas import FilaTarefas, ERRO, CANCELADA
+from filtro_navegador import montar_payload
+from tiles import gerar_tile
+
+# Painel de instrumentação (tempo e memória por etapa), exibido com ANALISE_CV_DEBUG=1
+MOSTRAR_INSTRUMENTACAO = os.environ.get("ANALISE_CV_DEBUG") == "1"
 
 # Inicializar o app Dash
-app = DashProxy(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-
-# Função para carregar e validar dados
-def carregar_dados_conteudo(conteudo):
-    # Decodificar o conteúdo do arquivo
-    content_type, content_string = conteudo.split(',')
-    decoded = io.StringIO(io.BytesIO(base64.b64decode(content_string)).read().decode('utf-8'))
-    df = pd.read_csv(decoded, delimiter=';')
-
-    colunas_necessarias = {"LATITUDE", "LONGITUDE", "DATA_FATO", "CODIGO_NATUREZA_PRINCIPAL", "SETOR", "UNID_REGISTRO_NIVEL_6"}
-    if not colunas_necessarias.issubset(df.columns):
-        raise ValueError("O arquivo CSV deve conter as colunas necessárias.")
-    
-    # Filtros de crimes violentos
-    naturezas_crimes_violentos = {"B01121", "B02001", "B01148", "C01157", "C01158", "D01213", "D01217", "C01159"}
-    df = df[df["CODIGO_NATUREZA_PRINCIPAL"].isin(naturezas_crimes_violentos)]
-    
-    # Conversões e limpeza
-    df["DATA_FATO"] = pd.to_datetime(df["DATA_FATO"], format="%d/%m/%Y", errors="coerce")
-    df["LATITUDE"] = pd.to_numeric(df["LATITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    df["LONGITUDE"] = pd.to_numeric(df["LONGITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    df = df.dropna(subset=["LATITUDE", "LONGITUDE", "DATA_FATO"])
-    return df
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+
+# Conjuntos de dados processados ficam no servidor; o navegador guarda apenas o identificador
+armazem = ArmazemDados(medir=lambda conjunto: conjunto.bytes())
+cache_disco = CacheDisco()
+
+# Uploads são processados em segundo plano; o navegador acompanha pelo identificador da tarefa
+fila_tarefas = FilaTarefas()
+
+# Figuras (JSON) e mapas (HTML) já serializados, por conjunto de dados e filtros; os descartados vão para o disco
+cache_render = CacheRender(diretorio=DIRETORIO_RENDER_PADRAO)
+
+# Payloads do filtro no navegador, um por conjunto de dados (até 256 MB)
+payloads_navegador = ArmazemDados(orcamento_bytes=256 * 1024 ** 2, medir=bytes_aproximados)
+
+# Função para carregar e validar os arquivos; os que não estão no cache em disco são processados em paralelo
+# buffers: arquivos já decodificados (decodificar_upload); progresso(fracao, mensagem) é chamado conforme a leitura avança
+def carregar_arquivos(ids, buffers, progresso=None):
+    faltantes = [posicao for posicao, dataset_id in enumerate(ids) if not cache_disco.contem(dataset_id)]
+    buffers = [buffers[posicao] for posicao in faltantes]
+    # Um arquivo só pode ser dividido entre processos; vários são lidos lado a lado
+    if progresso is None:
+        dfs = ler_varios_csv(buffers) if len(buffers) > 1 else [ler_csv(buffer) for buffer in buffers]
+    elif len(buffers) > 1:
+        dfs = ler_varios_csv(buffers, progresso=lambda fracao, concluidos: progresso(fracao, f"{concluidos}/{len(buffers)} arquivos lidos"))
+    else:
+        dfs = [ler_csv(buffer, progresso=lambda fracao, linhas: progresso(fracao, f"{linhas:,} linhas lidas")) for buffer in buffers]
+    lidos = {ids[posicao]: cache_disco.guardar(ids[posicao], df) for posicao, df in zip(faltantes, dfs)}
+    return [(dataset_id, lidos[dataset_id] if dataset_id in lidos else cache_disco.obter(dataset_id)) for dataset_id in ids]
 
 # Layout do aplicativo
 app.layout = html.Div([
     html.H1("Análise de Crimes Violentos", style={"textAlign": "center"}),
 
-    # Componente para upload do arquivo
+    # Componente para upload dos arquivos (um ou mais meses)
     html.Div([
-        html.Label("Faça upload do arquivo CSV:"),
+        html.Label("Faça upload dos arquivos CSV:"),
         dcc.Upload(
             id="upload-dados",
-            children=html.Button("Carregar Arquivo"),
-            multiple=False
+            children=html.Button("Carregar Arquivos"),
+            multiple=True
+        ),
+        dcc.Checklist(
+            id="anexar-dados",
+            options=[{"label": " Anexar ao conjunto já carregado", "value": "anexar"}],
+            value=[],
         ),
-        html.Div(id="mensagem-upload", style={"color": "red"})
+        html.Div(id="mensagem-upload", style={"color": "red"}),
+        dbc.Progress(id="progresso-upload", value=0, striped=True, animated=True, style={"display": "none"}),
+        html.Button("Cancelar", id="cancelar-upload", style={"display": "none"}),
+        dcc.Interval(id="intervalo-tarefa", interval=500, disabled=True),
+        dcc.Store(id="tarefa-id"),
+        dcc.Store(id="dataset-id"),
     ], style={"padding": "10px"}),
 
     # Dropdowns para filtros
@@ -53,76 +87,295 @@ app.layout = html.Div([
         dcc.Dropdown(id="filtro-setor", multi=False),
         html.Label("Selecione a Unidade:"),
         dcc.Dropdown(id="filtro-unidade", multi=False),
+        dcc.Checklist(
+            id="modo-navegador",
+            options=[{"label": " Filtrar no navegador (crossfilter: sem consultar o servidor a cada filtro)", "value": "navegador"}],
+            value=[],
+        ),
+        dcc.Store(id="payload-navegador"),
     ], style={"padding": "10px"}),
 
+    # Gráficos e mapa refeitos no navegador a partir do payload do conjunto de dados
+    html.Div([
+        dcc.Graph(id="grafico-barras-navegador"),
+        dcc.Graph(id="grafico-pizza-navegador"),
+        dcc.Graph(id="grafico-serie-navegador"),
+        dcc.Graph(id="mapa-navegador"),
+    ], id="graficos-navegador", style={"display": "none"}),
+
     # Gráficos
     html.Div([
         dcc.Graph(id="grafico-barras"),
         dcc.Graph(id="grafico-pizza"),
-    ]),
+    ], id="graficos-servidor"),
 
     # Mapa interativo
+    html.Div([
+        html.Label("Modo do mapa:"),
+        dcc.RadioItems(
+            id="modo-mapa",
+            options=[
+                {"label": "Pontos", "value": "pontos"},
+                {"label": "Grade quadrada", "value": "quadrado"},
+                {"label": "Grade hexagonal", "value": "hexagono"},
+                {"label": "Tiles (só a área visível)", "value": "tiles"},
+            ],
+            value="pontos",
+            inline=True,
+        ),
+        html.Label("Nível de zoom (define o tamanho da célula):"),
+        dcc.Slider(id="zoom-grade", min=8, max=16, step=1, value=12),
+    ], id="opcoes-mapa-servidor", style={"padding": "10px"}),
     html.Div(id="mapa-interativo", style={"height": "500px"}),
+    # ETag das figuras e do mapa que o navegador já tem
+    dcc.Store(id="etags-graficos", data={}),
+
+    # Painel de instrumentação
+    html.Details([
+        html.Summary("Instrumentação"),
+        html.Button("Atualizar", id="atualizar-instrumentacao"),
+        html.Div(id="tabela-instrumentacao"),
+    ], style={"padding": "10px", "display": "block" if MOSTRAR_INSTRUMENTACAO else "none"}),
 ])
 
-# Callbacks para carregar dados do arquivo e atualizar opções dos filtros
+# Função executada em segundo plano: decodifica, lê e monta o conjunto; retorna o identificador do conjunto
+def processar_upload(tarefa, contents, filenames, anexar, dataset_id_atual):
+    with execucao("dash:carregar_dados"):
+        # Cada arquivo só é processado na primeira vez que o conteúdo aparece;
+        # depois vem da memória ou, após reiniciar o servidor, do cache em disco
+        tarefa.atualizar(0.0, "Decodificando arquivo(s)...")
+        with etapa("decodificar"):
+            decodificados = [decodificar_upload(conteudo, nome) for conteudo, nome in zip(contents, filenames)]
+            buffers = [buffer for buffer, _ in decodificados]
+            ids = [dataset_id for _, dataset_id in decodificados]
+
+        # Ao anexar, só os arquivos que ainda não fazem parte do conjunto atual são processados
+        base = armazem.obter(dataset_id_atual) if anexar and dataset_id_atual else None
+        arquivos = tuple(dict.fromkeys((base.arquivos if base is not None else ()) + tuple(ids)))
+        conjunto = armazem.obter(identificador_conjunto(arquivos))
+        if conjunto is None:
+            novos = [posicao for posicao, dataset_id in enumerate(ids) if base is None or dataset_id not in base.arquivos]
+            # A leitura vai de 10% a 90% da barra; a fração é desconhecida (None) quando o tamanho não é
+            def progresso(fracao, mensagem):
+                tarefa.atualizar(None if fracao is None else 0.1 + 0.8 * fracao, f"Carregando... {mensagem}")
+            with etapa("carregar") as registro:
+                pares = carregar_arquivos([ids[p] for p in novos], [buffers[p] for p in novos], progresso)
+                registro["linhas_saida"] = sum(len(df) for _, df in pares)
+            tarefa.atualizar(0.9, "Montando índices e agregações...")
+            with etapa("montar_conjunto"):
+                conjunto = base.anexar_varios(pares) if base is not None else ConjuntoDados.montar(pares)
+            tarefa.atualizar()
+            armazem.guardar(conjunto.dataset_id, conjunto)
+
+        tarefa.mensagem = f"Arquivo(s) {', '.join(filenames)} carregado(s) com sucesso! {len(conjunto.dados):,} ocorrências no conjunto."
+        return conjunto.dataset_id
+
+# Callback do upload: só agenda o processamento e devolve o identificador da tarefa
+@app.callback(
+    Output("tarefa-id", "data"),
+    [Input("upload-dados", "contents")],
+    [State("upload-dados", "filename"),
+     State("anexar-dados", "value"),
+     State("dataset-id", "data")]
+)
+def carregar_dados(contents, filenames, anexar, dataset_id_atual):
+    if not contents:
+        return None
+    return fila_tarefas.enviar(processar_upload, contents, filenames, anexar, dataset_id_atual)
+
+# Callback para acompanhar (ou cancelar) a tarefa e, ao concluir, liberar filtros e gráficos
 @app.callback(
     [Output("filtro-setor", "options"),
      Output("filtro-unidade", "options"),
-     Output("mensagem-upload", "children")],
-    [Input("upload-dados", "contents")],
-    [State("upload-dados", "filename")]
+     Output("mensagem-upload", "children"),
+     Output("dataset-id", "data"),
+     Output("progresso-upload", "value"),
+     Output("progresso-upload", "style"),
+     Output("cancelar-upload", "style"),
+     Output("intervalo-tarefa", "disabled")],
+    [Input("tarefa-id", "data"),
+     Input("intervalo-tarefa", "n_intervals"),
+     Input("cancelar-upload", "n_clicks")]
 )
-def carregar_dados(contents, filename):
-    if contents is None:
-        return [], [], "Nenhum arquivo carregado."
-    
-    try:
-        df = carregar_dados_conteudo(contents)
-        setores = [{"label": s, "value": s} for s in sorted(df["SETOR"].unique())]
-        unidades = [{"label": u, "value": u} for u in sorted(df["UNID_REGISTRO_NIVEL_6"].unique())]
-        return setores, unidades, f"Arquivo {filename} carregado com sucesso!"
-    except Exception as e:
-        return [], [], f"Erro ao carregar o arquivo: {str(e)}"
+def acompanhar_carga(tarefa_id, _, __):
+    oculto = {"display": "none"}
+    if tarefa_id is None:
+        return [], [], "Nenhum arquivo carregado.", None, 0, oculto, oculto, True
+    if ctx.triggered_id == "cancelar-upload":
+        fila_tarefas.cancelar(tarefa_id)
+    tarefa = fila_tarefas.obter(tarefa_id)
+    if tarefa is None:
+        return no_update, no_update, "Tarefa não encontrada. Carregue o arquivo novamente.", no_update, 0, oculto, oculto, True
+
+    if not tarefa.finalizada:
+        return no_update, no_update, tarefa.mensagem, no_update, round(tarefa.progresso * 100), {"display": "flex"}, {}, False
+    if tarefa.estado == ERRO:
+        return [], [], f"Erro ao carregar o arquivo: {tarefa.erro}", None, 0, oculto, oculto, True
+    if tarefa.estado == CANCELADA:
+        return no_update, no_update, tarefa.mensagem, no_update, 0, oculto, oculto, True
+
+    conjunto = armazem.obter(tarefa.resultado)
+    if conjunto is None:
+        return [], [], "Os dados expiraram no servidor. Carregue o arquivo novamente.", None, 0, oculto, oculto, True
+    setores = [{"label": s, "value": s} for s in opcoes(conjunto.indices, "SETOR")]
+    unidades = [{"label": u, "value": u} for u in opcoes(conjunto.indices, "UNID_REGISTRO_NIVEL_6")]
+    return setores, unidades, tarefa.mensagem, conjunto.dataset_id, 100, oculto, oculto, True
 
 # Callbacks para atualizar gráficos e mapa
 @app.callback(
     [Output("grafico-barras", "figure"),
      Output("grafico-pizza", "figure"),
-     Output("mapa-interativo", "children")],
+     Output("mapa-interativo", "children"),
+     Output("etags-graficos", "data")],
     [Input("filtro-setor", "value"),
      Input("filtro-unidade", "value"),
-     Input("upload-dados", "contents")],
-    [State("upload-dados", "filename")]
+     Input("dataset-id", "data"),
+     Input("modo-mapa", "value"),
+     Input("zoom-grade", "value"),
+     Input("modo-navegador", "value")],
+    [State("etags-graficos", "data")]
 )
-def atualizar_graficos(setor, unidade, contents, filename):
-    if contents is None:
-        return {}, {}, "Nenhum arquivo carregado para visualização."
+def atualizar_graficos(setor, unidade, dataset_id, modo_mapa, zoom, modo_navegador, etags):
+    # No filtro pelo navegador, os gráficos do servidor ficam ocultos e não são refeitos
+    if modo_navegador:
+        raise PreventUpdate
+    if dataset_id is None:
+        return {}, {}, "Nenhum arquivo carregado para visualização.", {}
     
+    with execucao("dash:atualizar_graficos"):
+        return _atualizar_graficos(setor, unidade, dataset_id, modo_mapa, zoom, etags or {})
+
+def _atualizar_graficos(setor, unidade, dataset_id, modo_mapa, zoom, etags):
     try:
-        df_filtrado = carregar_dados_conteudo(contents)
-        if setor:
-            df_filtrado = df_filtrado[df_filtrado["SETOR"] == setor]
-        if unidade:
-            df_filtrado = df_filtrado[df_filtrado["UNID_REGISTRO_NIVEL_6"] == unidade]
-        
-        # Gráfico de Barras
-        barra_local = df_filtrado["SETOR"].value_counts().reset_index(name="QUANTIDADE")
-        barra_local.rename(columns={"index": "SETOR"}, inplace=True)
-        fig_barras = px.bar(barra_local, x="SETOR", y="QUANTIDADE", labels={"SETOR": "Setor", "QUANTIDADE": "Quantidade"})
-        
-        # Gráfico de Pizza
-        fig_pizza = px.pie(barra_local, names="SETOR", values="QUANTIDADE")
+        conjunto = armazem.obter(dataset_id)
+        if conjunto is None:
+            return {}, {}, "Os dados expiraram no servidor. Carregue o arquivo novamente.", {}
+        selecoes = {
+            "SETOR": [setor] if setor else [],
+            "UNID_REGISTRO_NIVEL_6": [unidade] if unidade else [],
+        }
+        # Figuras e mapa já serializados para este conjunto e filtros vêm do cache de render,
+        # sem agregar, montar nem serializar de novo
+        chave = (dataset_id, "dash", setor, unidade)
+        agregados = {}
+
+        def barra_local():
+            if "setor" not in agregados:
+                with etapa("agregar", len(conjunto.cubo)) as registro:
+                    agregados["setor"] = contagem_por(conjunto.cubo, "SETOR", selecoes)
+                    registro["linhas_saida"] = len(agregados["setor"])
+            return agregados["setor"]
+
+        figuras = {}
+        with etapa("figura"):
+            # Gráfico de Barras
+            figuras["barras"] = cache_render.obter_ou_renderizar(chave + ("barras",), lambda: px.bar(
+                barra_local(), x="SETOR", y="QUANTIDADE", labels={"SETOR": "Setor", "QUANTIDADE": "Quantidade"}).to_json())
+            # Gráfico de Pizza
+            figuras["pizza"] = cache_render.obter_ou_renderizar(chave + ("pizza",), lambda: px.pie(
+                barra_local(), names="SETOR", values="QUANTIDADE").to_json())
         
         # Mapa interativo
-        mapa = folium.Map(location=[df_filtrado["LATITUDE"].mean(), df_filtrado["LONGITUDE"].mean()], zoom_start=12)
-        for _, row in df_filtrado.iterrows():
-            folium.Marker([row["LATITUDE"], row["LONGITUDE"]], popup=row["CODIGO_NATUREZA_PRINCIPAL"]).add_to(mapa)
-        mapa_html = folium_static(mapa)._repr_html_()
-        
-        return fig_barras, fig_pizza, html.Iframe(srcDoc=mapa_html, width="100%", height="500px")
+        def renderizar_mapa():
+            with etapa("filtrar", len(conjunto.dados)) as registro:
+                df_filtrado = filtrar(conjunto.dados, conjunto.indices, selecoes)
+                registro["linhas_saida"] = len(df_filtrado)
+            with etapa("mapa", len(df_filtrado)):
+                if modo_mapa == "pontos":
+                    mapa = criar_mapa(df_filtrado)
+                elif modo_mapa == "tiles":
+                    # Os pontos são buscados pelo próprio mapa em /tiles, só para a área visível
+                    filtros = urlencode({coluna: valores[0] for coluna, valores in selecoes.items() if valores})
+                    url = f"/tiles/{dataset_id}/{{z}}/{{x}}/{{y}}.geojson" + (f"?{filtros}" if filtros else "")
+                    mapa = criar_mapa_tiles(centro_mapa(df_filtrado), url, zoom_start=zoom)
+                else:
+                    mapa = criar_mapa_grade(df_filtrado, (dataset_id, setor, unidade), zoom=zoom, forma=modo_mapa)
+            with etapa("serializar"):
+                return mapa.get_root().render()
+        figuras["mapa"] = cache_render.obter_ou_renderizar(chave + ("mapa", modo_mapa, None if modo_mapa == "pontos" else zoom), renderizar_mapa)
+
+        # O que o navegador já tem (mesma ETag) não é enviado de novo; o mapa é carregado
+        # pelo iframe em /render, com resposta condicional (304) pela ETag
+        saidas = []
+        for nome, (identificador, etag, texto) in figuras.items():
+            if etags.get(nome) == etag:
+                saidas.append(no_update)
+            elif nome == "mapa":
+                saidas.append(html.Iframe(src=f"/render/{identificador}", width="100%", height="500px"))
+            else:
+                saidas.append(json.loads(texto))
+        return (*saidas, {nome: etag for nome, (_, etag, _) in figuras.items()})
     except Exception as e:
-        return {}, {}, f"Erro ao processar os dados: {str(e)}"
+        return {}, {}, f"Erro ao processar os dados: {str(e)}", {}
+
+# Endpoint dos renders guardados (HTML dos mapas), com ETag: o navegador revalida e recebe 304 se nada mudou
+@app.server.route("/render/<identificador>")
+def servir_render(identificador):
+    item = cache_render.obter(identificador)
+    if item is None:
+        abort(404)
+    etag, texto = item
+    resposta = Response(texto, mimetype="text/html", headers={"Cache-Control": "no-cache"})
+    resposta.set_etag(etag)
+    return resposta.make_conditional(request)
+
+# Endpoint dos tiles GeoJSON do mapa no modo "tiles"; filtros por coluna na query string
+# (ex.: ?SETOR=S1&CODIGO_NATUREZA_PRINCIPAL=B01121, com a coluna repetida para vários valores)
+@app.server.route("/tiles/<dataset_id>/<int:z>/<int:x>/<int:y>.geojson")
+def servir_tile(dataset_id, z, x, y):
+    conjunto = armazem.obter(dataset_id)
+    if conjunto is None or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        abort(404)
+    selecoes = {coluna: request.args.getlist(coluna) for coluna in conjunto.indices}
+    with etapa("tile", len(conjunto.dados)):
+        conteudo = gerar_tile(conjunto, selecoes, z, x, y)
+    # O conjunto é imutável: o mesmo endereço sempre devolve o mesmo tile
+    return Response(conteudo, mimetype="application/geo+json", headers={"Cache-Control": "private, max-age=3600"})
+
+# Callback para enviar o payload do filtro no navegador (uma vez por conjunto de dados) e alternar os gráficos
+@app.callback(
+    [Output("payload-navegador", "data"),
+     Output("graficos-navegador", "style"),
+     Output("graficos-servidor", "style"),
+     Output("opcoes-mapa-servidor", "style"),
+     Output("mapa-interativo", "style")],
+    [Input("dataset-id", "data"),
+     Input("modo-navegador", "value")]
+)
+def enviar_payload_navegador(dataset_id, modo_navegador):
+    oculto = {"display": "none"}
+    if not modo_navegador:
+        return None, oculto, {}, {"padding": "10px"}, {"height": "500px"}
+    conjunto = armazem.obter(dataset_id) if dataset_id else None
+    if conjunto is None:
+        payload = None
+    else:
+        with execucao("dash:payload_navegador"), etapa("montar_payload", len(conjunto.dados)):
+            payload = payloads_navegador.obter_ou_carregar(dataset_id, lambda: montar_payload(conjunto))
+    return payload, {}, oculto, oculto, oculto
+
+# Filtro no navegador: barras, pizza, série e mapa refeitos em JavaScript (assets/filtro_navegador.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="filtro_navegador", function_name="atualizar"),
+    [Output("grafico-barras-navegador", "figure"),
+     Output("grafico-pizza-navegador", "figure"),
+     Output("grafico-serie-navegador", "figure"),
+     Output("mapa-navegador", "figure")],
+    [Input("payload-navegador", "data"),
+     Input("filtro-setor", "value"),
+     Input("filtro-unidade", "value")]
+)
+
+# Callback do painel de instrumentação
+@app.callback(
+    Output("tabela-instrumentacao", "children"),
+    [Input("atualizar-instrumentacao", "n_clicks")]
+)
+def atualizar_instrumentacao(_):
+    linhas = tabela_historico()
+    if not linhas:
+        return "Nenhuma execução registrada."
+    return dbc.Table.from_dataframe(pd.DataFrame(linhas), size="sm", striped=True)
 
 # Rodar o aplicativo
 if __name__ == "__main__":
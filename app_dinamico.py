@@ -1,8 +1,10 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import folium
 from streamlit_folium import folium_static
+from ingestao import ler_csv
+from mapas import criar_mapa
+from armazem_dados import identificador_conteudo
+from cache_disco import CacheDisco
 
 # Configuração da página
 st.set_page_config(
@@ -10,22 +12,32 @@ st.set_page_config(
     layout="wide",
 )
 
+# Cache local em disco dos arquivos já processados
+cache_disco = CacheDisco()
+
 # Função para carregar e validar dados
 @st.cache_data
-def carregar_dados(arquivo):
-    df = pd.read_csv(arquivo, delimiter=';')
-    colunas_necessarias = {"LATITUDE", "LONGITUDE", "DATA_FATO", "CODIGO_NATUREZA_PRINCIPAL", "SETOR", "UNID_REGISTRO_NIVEL_6"}
-    if not colunas_necessarias.issubset(df.columns):
-        st.error("O arquivo CSV deve conter as colunas necessárias: LATITUDE, LONGITUDE, DATA_FATO, CODIGO_NATUREZA_PRINCIPAL, SETOR e UNID_REGISTRO_NIVEL_6.")
+def carregar_dados(dataset_id, _arquivo):
+    # Arquivo já processado antes (mesmo em outra execução do servidor): lê do cache em disco
+    df = cache_disco.obter(dataset_id)
+    if df is not None:
+        return df
+
+    barra = st.sidebar.progress(0.0, text="Carregando arquivo...")
+
+    def atualizar_progresso(fracao, linhas_lidas):
+        if fracao is not None:
+            barra.progress(fracao, text=f"Carregando arquivo... {linhas_lidas:,} linhas lidas")
+
+    try:
+        df = ler_csv(_arquivo, progresso=atualizar_progresso)
+    except ValueError as erro:
+        st.error(str(erro))
         return None
-    
-    naturezas_crimes_violentos = {"B01121", "B02001", "B01148", "C01157", "C01158", "D01213", "D01217", "C01159"}
-    df = df[df["CODIGO_NATUREZA_PRINCIPAL"].isin(naturezas_crimes_violentos)]
-    df["DATA_FATO"] = pd.to_datetime(df["DATA_FATO"], format="%d/%m/%Y", errors="coerce")
-    df["LATITUDE"] = pd.to_numeric(df["LATITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    df["LONGITUDE"] = pd.to_numeric(df["LONGITUDE"].str.replace(",", ".", regex=False), errors="coerce")
-    df = df.dropna(subset=["LATITUDE", "LONGITUDE", "DATA_FATO"])
-    return df
+    finally:
+        barra.empty()
+
+    return cache_disco.guardar(dataset_id, df)
 
 # Layout principal
 st.sidebar.title("Navegação")
@@ -34,7 +46,11 @@ pagina = st.sidebar.radio("Escolha uma página", ["Introdução", "Análise por
 # Upload de arquivo
 st.sidebar.title("Upload de Arquivo")
 arquivo = st.sidebar.file_uploader("Faça upload do arquivo CSV", type=["csv"])
-dados = carregar_dados(arquivo) if arquivo else None
+dataset_id = identificador_conteudo(arquivo.getvalue()) if arquivo else None
+dados = carregar_dados(dataset_id, arquivo) if arquivo else None
+if dados is not None and "bytes_por_linha" in dados.attrs:
+    memoria = dados.attrs["bytes_por_linha"]
+    st.sidebar.caption(f"Memória por linha: {memoria['antes']:.0f} B → {memoria['depois']:.0f} B")
 
 # Inicialização do estado de sessão
 if "filtro_setor" not in st.session_state:
@@ -62,7 +78,7 @@ if pagina == "Análise por Local" and dados is not None:
         dados = dados[dados["SETOR"] == st.session_state["filtro_setor"]]
     
     st.subheader("Gráfico de Barras: Crimes por Região")
-    barra_local = dados["SETOR"].value_counts().reset_index(name="QUANTIDADE")
+    barra_local = dados["SETOR"].value_counts().loc[lambda contagem: contagem > 0].reset_index(name="QUANTIDADE")
     barra_local.rename(columns={"index": "SETOR"}, inplace=True)
     fig_barra = px.bar(barra_local, x="SETOR", y="QUANTIDADE", labels={"SETOR": "Setor", "QUANTIDADE": "Quantidade"})
     
@@ -77,9 +93,7 @@ if pagina == "Análise por Local" and dados is not None:
     st.plotly_chart(fig_pizza, use_container_width=True)
     
     st.subheader("Mapa Interativo")
-    mapa = folium.Map(location=[dados["LATITUDE"].mean(), dados["LONGITUDE"].mean()], zoom_start=12)
-    for _, row in dados.iterrows():
-        folium.Marker([row["LATITUDE"], row["LONGITUDE"]], popup=row["CODIGO_NATUREZA_PRINCIPAL"]).add_to(mapa)
+    mapa = criar_mapa(dados)
     folium_static(mapa)
 
 # Página 2 e Página 3 seguem a mesma lógica de dinamicidade
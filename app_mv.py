@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import random
-import math  # Para truncar os valores calculados
+from indicadores import calcular_indicadores, COLUNAS_TAXA
 
 # Configuração inicial
 st.set_page_config(page_title="Indicadores de Criminalidade", layout="wide")
@@ -78,11 +78,6 @@ menu = st.sidebar.selectbox(
 def gerar_valores_automaticos(min_val, max_val, rows, cols):
     return [[random.randint(min_val, max_val) for _ in range(len(cols))] for _ in range(len(rows))]
 
-# Função para truncar valores na 2ª casa decimal
-def truncar(valor, casas=2):
-    fator = 10 ** casas
-    return math.trunc(valor * fator) / fator
-
 # Função para verificar resposta
 def verificar_resposta(valor_calculado, valor_digitado):
     return "VERDE" if abs(valor_calculado - valor_digitado) < 0.01 else "VERMELHO"
@@ -131,12 +126,17 @@ if menu == "IMV" or menu == "IMT":
     with col2:
         
 
-        # Cálculos do IMV ou IMT
+        # Cálculos do IMV ou IMT (todos os anos de uma vez, pelo motor de indicadores)
+        calculados = calcular_indicadores(pd.DataFrame({
+            "ANO": [int(row) for row in rows],
+            "POP": populacao,
+            COLUNAS_TAXA[menu]: df[menu].to_numpy(),
+        })).set_index("ANO")
         with st.expander("Cálculos do Indicador", expanded=True):
             st.markdown("### Fórmula")
             st.latex(rf"{menu} = \frac{{\text{{{menu}}}}}{{\text{{POP}}}} \times 100.000")
             for i, row in enumerate(rows):
-                valor_calculado = truncar((df.loc[row, menu] / populacao) * 100000, 2)
+                valor_calculado = calculados.loc[int(row), menu]
                 resposta_digitada = st.number_input(
                     f"{menu} {row}:",
                     min_value=0.0,
@@ -158,8 +158,8 @@ if menu == "IMV" or menu == "IMT":
             try:
                 # Verifica se os valores de 2022 e 2023 são válidos
                 if df.loc["2022", menu] > 0 and df.loc["2023", menu] > 0:
-                    # Calcula a variação entre 2023 e 2022 com truncamento
-                    variacao_calculada = truncar(((df.loc["2023", menu] - df.loc["2022", menu]) / df.loc["2022", menu]) * 100, 2)
+                    # Variação entre 2023 e 2022 com truncamento
+                    variacao_calculada = calculados.loc[2023, f"VAR_{COLUNAS_TAXA[menu]}"]
 
                     # Mostra a fórmula
                     st.markdown("### Fórmula da Variação")
@@ -248,6 +248,15 @@ if menu == "ICCP":
         if st.session_state["valores_ICCP"] is not None:
             st.markdown("### Cálculos e Fórmulas")
 
+            # F ∝ R, ICCP e variações de todos os anos de uma vez, pelo motor de indicadores
+            calculados = calcular_indicadores(pd.DataFrame({
+                "ANO": [int(col) for col in cols],
+                "POP": populacao,
+                "FURTO": df_iccp.loc["FURTO"].to_numpy(),
+                "ROUBO": df_iccp.loc["ROUBO"].to_numpy(),
+                "EXTORSAO": df_iccp.loc["EXTORSÃO"].to_numpy(),
+            })).set_index("ANO")
+
             # Cálculo do Fator FURTO/ROUBO
             with st.expander("Cálculos do fator (F ∝ R)", expanded=True):
                 st.markdown("#### Cálculo do Fator F ∝ R")
@@ -258,7 +267,7 @@ if menu == "ICCP":
                         roubo = df_iccp.loc["ROUBO", ano_anterior]
 
                         if roubo > 0:
-                            fator_calculado = truncar(furto / roubo, 2)
+                            fator_calculado = calculados.loc[int(ano_atual), "F_R"]
                             fatores[ano_atual] = fator_calculado
                             fator_digitado = st.number_input(
                                 f"Digite o F ∝ R para {ano_atual} (baseado em {ano_anterior}):",
@@ -288,12 +297,7 @@ if menu == "ICCP":
                 for ano_atual, ano_anterior in [("2022", "2021"), ("2023", "2022")]:
                     try:
                         if ano_atual in fatores:
-                            fator = fatores[ano_atual]
-                            furto = df_iccp.loc["FURTO", ano_atual]
-                            roubo = df_iccp.loc["ROUBO", ano_atual]
-                            extorsao = df_iccp.loc["EXTORSÃO", ano_atual]
-
-                            iccp_calculado = truncar(((roubo * fator) + (extorsao * fator) + furto) / populacao * 100, 2)
+                            iccp_calculado = calculados.loc[int(ano_atual), "ICCP"]
                             iccp_digitado = st.number_input(
                                 f"Digite o ICCP Calculado para {ano_atual}:",
                                 min_value=0.0,
@@ -312,10 +316,7 @@ if menu == "ICCP":
             # Cálculo da Variação
             with st.expander("Cálculo da Variação", expanded=True):
                 try:
-                    furto_2022 = df_iccp.loc["FURTO", "2022"]
-                    furto_2023 = df_iccp.loc["FURTO", "2023"]
-
-                    variacao_calculada = truncar(((furto_2023 - furto_2022) / furto_2022) * 100, 2)
+                    variacao_calculada = calculados.loc[2023, "VAR_FURTO"]
                     variacao_digitada = st.number_input(
                         "Digite a variação calculada de FURTO (com 2 casas decimais):",
                         min_value=-100.0,
@@ -0,0 +1,116 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ingestao import bytes_em_memoria
+
+# Orçamento padrão de memória para os conjuntos de dados mantidos no servidor (1 GB)
+ORCAMENTO_PADRAO_BYTES = 1024 ** 3
+
+
+# Quantidade de caracteres hexadecimais do identificador de conteúdo
+TAMANHO_IDENTIFICADOR = 20
+
+
+# Função para gerar o identificador de um arquivo a partir do seu conteúdo
+def identificador_conteudo(conteudo):
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode("utf-8")
+    return hashlib.sha256(conteudo).hexdigest()[:TAMANHO_IDENTIFICADOR]
+
+
+# Função para estimar a memória de um resultado qualquer (DataFrame, array, figura do Plotly, listas...)
+def bytes_aproximados(valor):
+    if isinstance(valor, pd.DataFrame):
+        return bytes_em_memoria(valor)
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (str, bytes)):
+        return len(valor)
+    if hasattr(valor, "to_plotly_json"):
+        # Figuras do Plotly: o peso está nos arrays dos traços
+        return bytes_aproximados(valor.to_plotly_json())
+    if isinstance(valor, dict):
+        return sum(bytes_aproximados(item) for item in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(bytes_aproximados(item) for item in valor)
+    return sys.getsizeof(valor)
+
+
+# Armazém em memória dos DataFrames já processados, com descarte LRU por orçamento de bytes
+# medir(valor) informa quantos bytes cada item ocupa (por padrão, o tamanho do DataFrame)
+# ao_descartar(identificador, valor), se informado, recebe cada item descartado pelo orçamento
+class ArmazemDados:
+    def __init__(self, orcamento_bytes=ORCAMENTO_PADRAO_BYTES, medir=bytes_em_memoria, ao_descartar=None):
+        self.orcamento_bytes = orcamento_bytes
+        self.medir = medir
+        self.ao_descartar = ao_descartar
+        self._itens = OrderedDict()
+        self._bytes_em_uso = 0
+        self._trava = threading.Lock()
+
+    def __contains__(self, identificador):
+        with self._trava:
+            return identificador in self._itens
+
+    def __len__(self):
+        with self._trava:
+            return len(self._itens)
+
+    @property
+    def bytes_em_uso(self):
+        return self._bytes_em_uso
+
+    # Retorna o DataFrame guardado (ou None) e marca o item como usado recentemente
+    def obter(self, identificador):
+        with self._trava:
+            item = self._itens.get(identificador)
+            if item is None:
+                return None
+            self._itens.move_to_end(identificador)
+            return item[0]
+
+    # Guarda o DataFrame e descarta os itens menos usados até caber no orçamento
+    def guardar(self, identificador, df):
+        tamanho = self.medir(df)
+        with self._trava:
+            antigo = self._itens.pop(identificador, None)
+            if antigo is not None:
+                self._bytes_em_uso -= antigo[1]
+            self._itens[identificador] = (df, tamanho)
+            self._bytes_em_uso += tamanho
+            # O item recém-guardado é mantido mesmo que sozinho ultrapasse o orçamento
+            descartados = []
+            while self._bytes_em_uso > self.orcamento_bytes and len(self._itens) > 1:
+                identificador_descartado, (valor_descartado, tamanho_descartado) = self._itens.popitem(last=False)
+                self._bytes_em_uso -= tamanho_descartado
+                descartados.append((identificador_descartado, valor_descartado))
+        # Fora da trava: ao_descartar pode ser lento (ex.: gravar em disco)
+        if self.ao_descartar is not None:
+            for identificador_descartado, valor_descartado in descartados:
+                self.ao_descartar(identificador_descartado, valor_descartado)
+        return df
+
+    # Retorna o DataFrame guardado ou executa carregar() e guarda o resultado
+    def obter_ou_carregar(self, identificador, carregar):
+        df = self.obter(identificador)
+        if df is None:
+            df = self.guardar(identificador, carregar())
+        return df
+
+    # Retorna os valores guardados, do menos para o mais usado recentemente
+    def valores(self):
+        with self._trava:
+            return [valor for valor, _ in self._itens.values()]
+
+    def remover(self, identificador):
+        with self._trava:
+            item = self._itens.pop(identificador, None)
+            if item is not None:
+                self._bytes_em_uso -= item[1]
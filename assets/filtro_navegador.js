@@ -0,0 +1,104 @@
+// Filtro no navegador (crossfilter): refaz barras, pizza, série e mapa a partir do payload
+// enviado uma vez por conjunto de dados, sem chamar o servidor a cada mudança de filtro
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    filtro_navegador: {
+        atualizar: function (payload, setor, unidade) {
+            if (!payload) {
+                return [{}, {}, {}, {}];
+            }
+            // null: sem filtro; valor fora do conjunto: código -1, que não corresponde a nenhuma linha
+            var codigoSetor = (setor === null || setor === undefined) ? null : payload.setores.indexOf(setor);
+            var codigoUnidade = (unidade === null || unidade === undefined) ? null : payload.unidades.indexOf(unidade);
+
+            function selecionado(linhas, i) {
+                return (codigoSetor === null || linhas.setor[i] === codigoSetor) &&
+                    (codigoUnidade === null || linhas.unidade[i] === codigoUnidade);
+            }
+
+            // Contagens por setor e por dia
+            var contagens = payload.contagens;
+            var porSetor = new Array(payload.setores.length).fill(0);
+            var porDia = {};
+            for (var i = 0; i < contagens.quantidade.length; i++) {
+                if (!selecionado(contagens, i)) {
+                    continue;
+                }
+                porSetor[contagens.setor[i]] += contagens.quantidade[i];
+                porDia[contagens.dia[i]] = (porDia[contagens.dia[i]] || 0) + contagens.quantidade[i];
+            }
+
+            // Setores do maior para o menor, sem os zerados (como contagem_por)
+            var ordem = [];
+            for (var s = 0; s < porSetor.length; s++) {
+                if (porSetor[s] > 0) {
+                    ordem.push(s);
+                }
+            }
+            ordem.sort(function (a, b) { return porSetor[b] - porSetor[a]; });
+            var nomesSetores = ordem.map(function (s) { return payload.setores[s]; });
+            var valoresSetores = ordem.map(function (s) { return porSetor[s]; });
+
+            var barras = {
+                data: [{type: "bar", x: nomesSetores, y: valoresSetores}],
+                layout: {xaxis: {title: "Setor"}, yaxis: {title: "Quantidade"}}
+            };
+            var pizza = {
+                data: [{type: "pie", labels: nomesSetores, values: valoresSetores}],
+                layout: {}
+            };
+
+            var inicio = new Date(payload.inicio + "T00:00:00Z").getTime();
+            var dias = Object.keys(porDia).map(Number).sort(function (a, b) { return a - b; });
+            var serie = {
+                data: [{
+                    type: "scattergl",
+                    mode: "lines",
+                    x: dias.map(function (d) { return new Date(inicio + d * 86400000).toISOString().slice(0, 10); }),
+                    y: dias.map(function (d) { return porDia[d]; })
+                }],
+                layout: {xaxis: {title: "Data"}, yaxis: {title: "Crimes"}}
+            };
+
+            // Células do mapa somadas para a seleção atual
+            var celulas = payload.celulas;
+            var porCelula = {};
+            for (var j = 0; j < celulas.quantidade.length; j++) {
+                if (!selecionado(celulas, j)) {
+                    continue;
+                }
+                var chave = celulas.lat[j] + "," + celulas.lon[j];
+                porCelula[chave] = (porCelula[chave] || 0) + celulas.quantidade[j];
+            }
+            var latitudes = [], longitudes = [], totais = [];
+            Object.keys(porCelula).forEach(function (chave) {
+                var partes = chave.split(",");
+                latitudes.push(Number(partes[0]));
+                longitudes.push(Number(partes[1]));
+                totais.push(porCelula[chave]);
+            });
+            var maximo = Math.max.apply(null, totais.concat([1]));
+            var mapa = {
+                data: [{
+                    type: "scattermapbox",
+                    lat: latitudes,
+                    lon: longitudes,
+                    mode: "markers",
+                    text: totais.map(function (total) { return total + " crimes"; }),
+                    marker: {
+                        size: totais.map(function (total) { return 6 + 18 * Math.sqrt(total / maximo); }),
+                        color: totais,
+                        colorscale: "YlOrRd",
+                        showscale: true,
+                        opacity: 0.7
+                    }
+                }],
+                layout: {
+                    mapbox: {style: "open-street-map", center: {lat: payload.centro[0], lon: payload.centro[1]}, zoom: 11},
+                    margin: {l: 0, r: 0, t: 0, b: 0},
+                    height: 500
+                }
+            };
+            return [barras, pizza, serie, mapa];
+        }
+    }
+});
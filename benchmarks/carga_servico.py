@@ -0,0 +1,131 @@
+import argparse
+import http.client
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+from ingestao import ler_csv
+from conjunto_dados import ConjuntoDados
+from servico_consultas import DIMENSOES_CONSULTA, PERIODOS, ServicoConsultas, criar_servidor
+from benchmarks.gerar_dados import gerar_csv
+
+# Combinações de agrupamento sorteadas pelos clientes
+AGRUPAMENTOS = [
+    [],
+    ["SETOR"],
+    ["UNID_REGISTRO_NIVEL_6"],
+    ["CODIGO_NATUREZA_PRINCIPAL"],
+    ["SETOR", "CODIGO_NATUREZA_PRINCIPAL"],
+    ["UNID_REGISTRO_NIVEL_6", "MES_DESCRICAO"],
+]
+
+
+# Função para sortear as consultas (query strings) de um cliente: agrupamento, filtro, período, datas e formato
+def sortear_consultas(gerador, conjunto, quantidade, distintas):
+    cubo = conjunto.cubo
+    valores = {coluna: cubo[coluna].cat.categories.tolist() for coluna in DIMENSOES_CONSULTA}
+    dias = cubo["DATA_FATO"].drop_duplicates().sort_values().dt.strftime("%Y-%m-%d").tolist()
+    modelos = []
+    for _ in range(distintas):
+        parametros = [("dataset", conjunto.dataset_id)]
+        por = gerador.choice(AGRUPAMENTOS)
+        if por:
+            parametros.append(("por", ",".join(por)))
+        if gerador.random() < 0.5:
+            coluna = gerador.choice(DIMENSOES_CONSULTA)
+            parametros += [(coluna, valor) for valor in gerador.sample(valores[coluna], min(2, len(valores[coluna])))]
+        if gerador.random() < 0.5:
+            parametros.append(("periodo", gerador.choice(list(PERIODOS))))
+        if gerador.random() < 0.5:
+            inicio, fim = sorted(gerador.sample(range(len(dias)), 2))
+            parametros += [("inicio", dias[inicio]), ("fim", dias[fim])]
+        parametros.append(("formato", "arrow" if gerador.random() < 0.3 else "json"))
+        modelos.append("/contagens?" + urlencode(parametros))
+    return [gerador.choice(modelos) for _ in range(quantidade)]
+
+
+# Função para executar as consultas de um cliente numa conexão mantida aberta; guarda as latências em segundos
+def executar_cliente(host, porta, consultas, latencias, erros):
+    conexao = http.client.HTTPConnection(host, porta)
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        conexao.request("GET", consulta)
+        resposta = conexao.getresponse()
+        resposta.read()
+        latencias.append(time.perf_counter() - inicio)
+        if resposta.status != 200:
+            erros.append((resposta.status, consulta))
+    conexao.close()
+
+
+# Função para disparar os clientes em paralelo e resumir vazão e latências (p50, p95, p99)
+def gerar_carga(host, porta, consultas_por_cliente):
+    latencias, erros = [], []
+    clientes = [
+        threading.Thread(target=executar_cliente, args=(host, porta, consultas, latencias, erros))
+        for consultas in consultas_por_cliente
+    ]
+    inicio = time.perf_counter()
+    for cliente in clientes:
+        cliente.start()
+    for cliente in clientes:
+        cliente.join()
+    segundos = time.perf_counter() - inicio
+    milissegundos = np.array(latencias) * 1000
+    return {
+        "requisicoes": len(latencias),
+        "erros": len(erros),
+        "segundos": round(segundos, 3),
+        "requisicoes_por_segundo": round(len(latencias) / segundos, 1),
+        "p50_ms": round(float(np.percentile(milissegundos, 50)), 2),
+        "p95_ms": round(float(np.percentile(milissegundos, 95)), 2),
+        "p99_ms": round(float(np.percentile(milissegundos, 99)), 2),
+    }
+
+
+# Função para medir o serviço com dados sintéticos: primeira rodada com o cache de respostas vazio
+# (cada consulta distinta é calculada a partir do cubo) e segunda rodada com as mesmas consultas já em cache
+def executar(linhas, clientes, consultas, distintas, semente=0):
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = gerar_csv(os.path.join(diretorio, "sintetico.csv"), linhas, semente=semente)
+        conjunto = ConjuntoDados.de_arquivo("sintetico", ler_csv(caminho))
+
+    servico = ServicoConsultas()
+    servico.adicionar(conjunto)
+    servidor = criar_servidor(servico, "127.0.0.1", 0)
+    host, porta = servidor.server_address
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    gerador = random.Random(semente)
+    roteiros = [sortear_consultas(gerador, conjunto, consultas, distintas) for _ in range(clientes)]
+    try:
+        resultados = {
+            "cache_vazio": gerar_carga(host, porta, roteiros),
+            "cache_cheio": gerar_carga(host, porta, roteiros),
+        }
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera carga no serviço de consultas (dados sintéticos) e mede vazão e latência.")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas por cliente em cada rodada")
+    parser.add_argument("--distintas", type=int, default=200, help="Consultas distintas sorteadas por cliente")
+    argumentos = parser.parse_args()
+
+    resultados = executar(argumentos.linhas, argumentos.clientes, argumentos.consultas, argumentos.distintas)
+    print(f"{argumentos.linhas:,} linhas, {argumentos.clientes} clientes, {argumentos.consultas} consultas por cliente")
+    for rodada, resumo in resultados.items():
+        print(
+            f"  {rodada:<12} {resumo['requisicoes_por_segundo']:>9.1f} req/s  p50 {resumo['p50_ms']:>7.2f} ms  "
+            f"p95 {resumo['p95_ms']:>7.2f} ms  p99 {resumo['p99_ms']:>7.2f} ms  erros {resumo['erros']}"
+        )
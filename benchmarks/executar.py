@@ -0,0 +1,235 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ingestao import ler_csv, ler_csv_em_blocos, ler_csv_paralelo
+from indices import construir_indices, filtrar
+from agregados import construir_cubo, contagem_por, serie_diaria
+from mapas import criar_mapa, criar_mapa_grade
+from series_temporais import figura_serie
+from hotspots import calcular_hotspots
+from limites import Limites, juntar_setores
+from tiles import construir_indice_espacial, coordenadas_tile, feicoes_tile, posicoes_no_tile
+from upload import decodificar_upload
+from benchmarks.gerar_dados import gerar_csv
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+BASELINE_PADRAO = os.path.join(DIRETORIO_RESULTADOS, "baseline.json")
+
+# Aumento de tempo tolerado em relação à baseline antes de apontar regressão (20%)
+TOLERANCIA_PADRAO = 0.2
+
+
+# Se falso, as etapas rodam só uma vez, sem medir memória
+MEDIR_MEMORIA = True
+
+
+# Função para medir o tempo de uma etapa e, numa segunda execução, o pico de memória (tracemalloc);
+# as duas medições são separadas porque o tracemalloc deixa o código Python bem mais lento
+def medir(nome, funcao, linhas_entrada):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if MEDIR_MEMORIA:
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    medicao = {
+        "etapa": nome,
+        "segundos": round(segundos, 6),
+        "pico_memoria_mb": round(pico / 1024 ** 2, 3) if pico is not None else None,
+        "linhas_entrada": linhas_entrada,
+        "linhas_saida": len(resultado) if hasattr(resultado, "__len__") else None,
+    }
+    return resultado, medicao
+
+
+# Função para executar todas as etapas para um arquivo sintético de um tamanho
+def executar_tamanho(linhas, diretorio):
+    caminho = os.path.join(diretorio, f"sigop_{linhas}.csv")
+    if not os.path.exists(caminho):
+        gerar_csv(caminho, linhas)
+    medicoes = []
+
+    # Carga: caminho do Streamlit (carregar_dados) e do Dash (carregar_dados_conteudo, upload em base64)
+    dados, medicao = medir("carregar_dados", lambda: ler_csv_em_blocos(caminho), linhas)
+    medicoes.append(medicao)
+    with open(caminho, "rb") as handle:
+        conteudo = "data:text/csv;base64," + base64.b64encode(handle.read()).decode("ascii")
+    _, medicao = medir(
+        "carregar_dados_conteudo",
+        lambda: ler_csv(decodificar_upload(conteudo)[0]),
+        linhas,
+    )
+    medicoes.append(medicao)
+    del conteudo
+    # Em paralelo a memória fica nos processos e não aparece no tracemalloc: vale só o tempo
+    _, medicao = medir("carregar_dados_paralelo", lambda: ler_csv_paralelo(caminho), linhas)
+    medicoes.append(medicao)
+
+    # Filtros da barra lateral: máscara isin sobre todas as linhas x índices
+    setores = sorted(dados["SETOR"].cat.categories)[:3]
+    unidades = sorted(dados["UNID_REGISTRO_NIVEL_6"].cat.categories)[:1]
+    selecoes = {"SETOR": setores, "UNID_REGISTRO_NIVEL_6": unidades}
+    _, medicao = medir(
+        "filtro_isin",
+        lambda: dados[dados["SETOR"].isin(setores) & dados["UNID_REGISTRO_NIVEL_6"].isin(unidades)],
+        len(dados),
+    )
+    medicoes.append(medicao)
+    indices, medicao = medir("construir_indices", lambda: construir_indices(dados), len(dados))
+    medicoes.append(medicao)
+    filtrado, medicao = medir("filtro_indices", lambda: filtrar(dados, indices, selecoes), len(dados))
+    medicoes.append(medicao)
+
+    # Agregações dos gráficos
+    _, medicao = medir("value_counts_setor", lambda: dados["SETOR"].value_counts(), len(dados))
+    medicoes.append(medicao)
+    cubo, medicao = medir("construir_cubo", lambda: construir_cubo(dados), len(dados))
+    medicoes.append(medicao)
+    for coluna in ["SETOR", "MES_DESCRICAO", "CODIGO_NATUREZA_PRINCIPAL"]:
+        _, medicao = medir(f"contagem_por_{coluna.lower()}", lambda: contagem_por(cubo, coluna, selecoes), len(cubo))
+        medicoes.append(medicao)
+    _, medicao = medir("serie_diaria", lambda: serie_diaria(cubo, selecoes), len(cubo))
+    medicoes.append(medicao)
+    serie_setores = serie_diaria(cubo, por="SETOR")
+    json_figura, medicao = medir("figura_serie_setores", lambda: figura_serie(serie_setores, "Dia", por="SETOR")[0].to_json(), len(serie_setores))
+    medicao["linhas_saida"] = None
+    medicao["bytes_json"] = len(json_figura)
+    medicoes.append(medicao)
+
+    # Mapas (montagem + HTML final, que é o que vai para o navegador)
+    for nome, criar in [
+        ("mapa_pontos", lambda: criar_mapa(dados)),
+        ("mapa_pontos_filtrado", lambda: criar_mapa(filtrado)),
+        # Chave nova a cada chamada para não medir o cache de grades
+        ("mapa_grade_hexagonal", lambda: criar_mapa_grade(dados, ("benchmark", time.perf_counter_ns()), zoom=12, forma="hexagono")),
+    ]:
+        html, medicao = medir(nome, lambda: criar().get_root().render(), len(dados))
+        medicao["linhas_saida"] = None
+        medicao["bytes_html"] = len(html)
+        medicoes.append(medicao)
+
+    # Tiles do mapa: índice espacial e os tiles de uma tela (4 x 3 tiles de 256 px no zoom 12), sem cache
+    indice_espacial, medicao = medir("construir_indice_espacial", lambda: construir_indice_espacial(dados), len(dados))
+    medicoes.append(medicao)
+    centro_x, centro_y = coordenadas_tile(dados["LATITUDE"].to_numpy(dtype="float64").mean(), dados["LONGITUDE"].to_numpy(dtype="float64").mean(), 12)
+    tela = [(int(centro_x) + dx, int(centro_y) + dy) for dx in range(-2, 2) for dy in range(-1, 2)]
+
+    def gerar_tela():
+        return [json.dumps(feicoes_tile(dados, posicoes_no_tile(dados, indice_espacial, 12, x, y), 12, x, y)) for x, y in tela]
+    tiles, medicao = medir("tiles_tela_zoom12", gerar_tela, len(dados))
+    medicao["linhas_saida"] = None
+    medicao["bytes_json"] = sum(len(tile) for tile in tiles)
+    medicoes.append(medicao)
+
+    # Superfícies de hotspots (grade de 250 m, vizinhança de 500 m)
+    for metodo in ["kde", "gi"]:
+        _, medicao = medir(f"hotspots_{metodo}", lambda: calcular_hotspots(dados, metodo), len(dados))
+        medicao["linhas_saida"] = None
+        medicoes.append(medicao)
+
+    # Junção espacial com 100 setores (grade 10 x 10 sobre a área dos pontos)
+    _, medicao = medir("juntar_setores", lambda: juntar_setores(dados, limites_sinteticos(dados)), len(dados))
+    medicoes.append(medicao)
+
+    return {"linhas": linhas, "linhas_violentas": len(dados), "etapas": medicoes}
+
+
+# Função para gerar limites sintéticos: lado x lado setores retangulares cobrindo os pontos
+def limites_sinteticos(dados, lado=10):
+    lat_min, lat_max = float(dados["LATITUDE"].min()), float(dados["LATITUDE"].max()) + 1e-6
+    lon_min, lon_max = float(dados["LONGITUDE"].min()), float(dados["LONGITUDE"].max()) + 1e-6
+    passo_lat, passo_lon = (lat_max - lat_min) / lado, (lon_max - lon_min) / lado
+    nomes, aneis, caixas = [], [], []
+    for i in range(lado):
+        for j in range(lado):
+            x0, y0 = lon_min + j * passo_lon, lat_min + i * passo_lat
+            nomes.append(f"SETOR {i * lado + j + 1}")
+            aneis.append([np.array([[x0, y0], [x0 + passo_lon, y0], [x0 + passo_lon, y0 + passo_lat], [x0, y0 + passo_lat], [x0, y0]])])
+            caixas.append((x0, y0, x0 + passo_lon, y0 + passo_lat))
+    return Limites(nomes, aneis, np.array(caixas))
+
+
+# Função para comparar os tempos com a baseline; retorna a lista de regressões
+def comparar(resultados, baseline, tolerancia=TOLERANCIA_PADRAO):
+    referencia = {
+        (tamanho["linhas"], etapa["etapa"]): etapa["segundos"]
+        for tamanho in baseline["tamanhos"] for etapa in tamanho["etapas"]
+    }
+    regressoes = []
+    for tamanho in resultados["tamanhos"]:
+        for etapa in tamanho["etapas"]:
+            anterior = referencia.get((tamanho["linhas"], etapa["etapa"]))
+            if anterior and etapa["segundos"] > anterior * (1 + tolerancia):
+                regressoes.append({
+                    "linhas": tamanho["linhas"],
+                    "etapa": etapa["etapa"],
+                    "baseline": anterior,
+                    "atual": etapa["segundos"],
+                })
+    return regressoes
+
+
+# Função para imprimir as medições em forma de tabela
+def imprimir(resultados):
+    for tamanho in resultados["tamanhos"]:
+        print(f"\n{tamanho['linhas']:,} linhas ({tamanho['linhas_violentas']:,} crimes violentos)")
+        for etapa in tamanho["etapas"]:
+            extra = f"  {etapa['bytes_html'] / 1024:,.0f} KB de HTML" if "bytes_html" in etapa else ""
+            extra = f"  {etapa['bytes_json'] / 1024:,.0f} KB de JSON" if "bytes_json" in etapa else extra
+            memoria = f"{etapa['pico_memoria_mb']:>10.1f} MB" if etapa["pico_memoria_mb"] is not None else " " * 13
+            print(f"  {etapa['etapa']:<40} {etapa['segundos']:>10.4f} s {memoria}{extra}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede carga, filtros, agregações e mapas com dados sintéticos do SiGOp.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO)
+    parser.add_argument("--diretorio-dados", default=os.path.join(tempfile.gettempdir(), "analise_cv_benchmarks"))
+    parser.add_argument("--saida", default=os.path.join(DIRETORIO_RESULTADOS, f"resultado_{time.strftime('%Y%m%d_%H%M%S')}.json"))
+    parser.add_argument("--comparar", nargs="?", const=BASELINE_PADRAO, help="Compara com a baseline e sai com código 1 se houver regressão")
+    parser.add_argument("--salvar-baseline", action="store_true", help=f"Grava o resultado também em {BASELINE_PADRAO}")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    parser.add_argument("--sem-memoria", action="store_true", help="Não mede o pico de memória (cada etapa roda uma vez só)")
+    argumentos = parser.parse_args()
+    MEDIR_MEMORIA = not argumentos.sem_memoria
+
+    os.makedirs(argumentos.diretorio_dados, exist_ok=True)
+    resultados = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "maquina": platform.platform(),
+        "processadores": os.cpu_count(),
+        "tamanhos": [executar_tamanho(linhas, argumentos.diretorio_dados) for linhas in argumentos.tamanhos],
+    }
+    imprimir(resultados)
+
+    os.makedirs(os.path.dirname(argumentos.saida), exist_ok=True)
+    with open(argumentos.saida, "w", encoding="utf-8") as handle:
+        json.dump(resultados, handle, indent=2, ensure_ascii=False)
+    if argumentos.salvar_baseline:
+        os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+        with open(BASELINE_PADRAO, "w", encoding="utf-8") as handle:
+            json.dump(resultados, handle, indent=2, ensure_ascii=False)
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as handle:
+            regressoes = comparar(resultados, json.load(handle), argumentos.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao['linhas']:,} linhas / {regressao['etapa']}: "
+                  f"{regressao['baseline']:.4f} s -> {regressao['atual']:.4f} s")
+        sys.exit(1 if regressoes else 0)
@@ -0,0 +1,87 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ingestao import NATUREZAS_CRIMES_VIOLENTOS
+
+# Naturezas não violentas misturadas ao arquivo (descartadas pela ingestão)
+NATUREZAS_NAO_VIOLENTAS = ["C01155", "C01180", "A19000", "B01129", "E03000", "C01163"]
+
+MESES = ["JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO", "JULHO",
+         "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"]
+
+# Centro aproximado de Belo Horizonte; os setores ficam espalhados em torno dele
+CENTRO = (-19.9167, -43.9345)
+
+LINHAS_POR_ESCRITA = 500_000
+
+
+# Função para gerar um bloco de linhas sintéticas no formato da exportação do SiGOp
+def gerar_bloco(gerador, inicio, linhas, setores, unidades, fracao_violentos, fracao_invalidos, ano):
+    setor = gerador.integers(0, setores, linhas)
+    # Cada setor tem um centro fixo (mesma semente para todos os blocos) e uma unidade responsável
+    centros = np.random.default_rng(setores).normal(0, 0.08, (setores, 2)) + CENTRO
+    latitude = centros[setor, 0] + gerador.normal(0, 0.01, linhas)
+    longitude = centros[setor, 1] + gerador.normal(0, 0.01, linhas)
+
+    # Textos repetidos como categorias: o to_csv escreve sem formatar valor a valor
+    dias = pd.date_range(f"{ano}-01-01", periods=365, freq="D")
+    dia = gerador.integers(0, len(dias), linhas)
+    violentos = sorted(NATUREZAS_CRIMES_VIOLENTOS)
+    natureza = np.where(
+        gerador.random(linhas) < fracao_violentos,
+        gerador.integers(0, len(violentos), linhas),
+        len(violentos) + gerador.integers(0, len(NATUREZAS_NAO_VIOLENTAS), linhas),
+    )
+
+    df = pd.DataFrame({
+        "NUMERO_OCORRENCIA": ano * 10 ** 9 + np.arange(inicio, inicio + linhas),
+        "DATA_FATO": pd.Categorical.from_codes(dia, dias.strftime("%d/%m/%Y")),
+        "MES_DESCRICAO": pd.Categorical.from_codes(dias.month[dia] - 1, MESES),
+        "CODIGO_NATUREZA_PRINCIPAL": pd.Categorical.from_codes(natureza, violentos + NATUREZAS_NAO_VIOLENTAS),
+        "SETOR": pd.Categorical.from_codes(setor, [f"SETOR {numero + 1}" for numero in range(setores)]),
+        "UNID_REGISTRO_NIVEL_6": pd.Categorical.from_codes(setor % unidades, [f"{numero + 1} CIA PM" for numero in range(unidades)]),
+        "LATITUDE": latitude,
+        "LONGITUDE": longitude,
+        "LOGRADOURO": "RUA SINTETICA",
+        "BAIRRO": pd.Categorical.from_codes(gerador.integers(0, 400, linhas), [f"BAIRRO {numero + 1}" for numero in range(400)]),
+        "MUNICIPIO": "BELO HORIZONTE",
+    })
+
+    # Linhas com data ou coordenadas inválidas, como acontece nas exportações reais
+    invalidos = gerador.random(linhas) < fracao_invalidos
+    metade = invalidos & (gerador.random(linhas) < 0.5)
+    df["DATA_FATO"] = df["DATA_FATO"].cat.add_categories(["00/00/0000"])
+    df.loc[metade, "DATA_FATO"] = "00/00/0000"
+    df.loc[invalidos & ~metade, "LATITUDE"] = np.nan
+    return df
+
+
+# Função para gravar um CSV sintético com o delimitador ";" e decimais com vírgula
+def gerar_csv(caminho, linhas, setores=40, unidades=8, fracao_violentos=0.4, fracao_invalidos=0.02, ano=2023, semente=0):
+    gerador = np.random.default_rng(semente)
+    escritas = 0
+    while escritas < linhas:
+        quantidade = min(LINHAS_POR_ESCRITA, linhas - escritas)
+        bloco = gerar_bloco(gerador, escritas, quantidade, setores, unidades, fracao_violentos, fracao_invalidos, ano)
+        bloco.to_csv(
+            caminho, sep=";", decimal=",", float_format="%.6f", index=False,
+            mode="w" if escritas == 0 else "a", header=escritas == 0,
+        )
+        escritas += quantidade
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um CSV sintético no formato do SiGOp (sem dados reais).")
+    parser.add_argument("caminho")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--setores", type=int, default=40)
+    parser.add_argument("--unidades", type=int, default=8)
+    parser.add_argument("--fracao-violentos", type=float, default=0.4)
+    parser.add_argument("--ano", type=int, default=2023)
+    parser.add_argument("--semente", type=int, default=0)
+    argumentos = parser.parse_args()
+    gerar_csv(argumentos.caminho, argumentos.linhas, argumentos.setores, argumentos.unidades,
+              argumentos.fracao_violentos, ano=argumentos.ano, semente=argumentos.semente)
@@ -0,0 +1,113 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from ingestao import VERSAO_LIMPEZA, NATUREZAS_CRIMES_VIOLENTOS, COLUNAS_NECESSARIAS, COLUNAS_OPCIONAIS
+
+# Pasta local do cache (os dados nunca saem da máquina do usuário)
+DIRETORIO_PADRAO = os.environ.get("ANALISE_CV_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "analise_cv"))
+
+# Espaço máximo ocupado pelo cache em disco (5 GB)
+ORCAMENTO_PADRAO_BYTES = 5 * 1024 ** 3
+
+EXTENSAO = ".feather"
+
+# Chave dos metadados do arquivo onde ficam os attrs do DataFrame
+CHAVE_METADADOS = b"analise_cv.attrs"
+
+
+# Função para gerar a assinatura das regras de limpeza; muda quando a versão,
+# a lista de naturezas ou as colunas lidas mudam, invalidando o cache antigo
+def assinatura_regras():
+    regras = json.dumps({
+        "versao": VERSAO_LIMPEZA,
+        "naturezas": sorted(NATUREZAS_CRIMES_VIOLENTOS),
+        "colunas": sorted(COLUNAS_NECESSARIAS | COLUNAS_OPCIONAIS),
+    })
+    return hashlib.sha256(regras.encode("utf-8")).hexdigest()[:12]
+
+
+# Cache em disco dos DataFrames já limpos, em formato colunar (Feather/Arrow) lido por mapeamento de memória
+class CacheDisco:
+    def __init__(self, diretorio=DIRETORIO_PADRAO, orcamento_bytes=ORCAMENTO_PADRAO_BYTES):
+        self.diretorio = diretorio
+        self.orcamento_bytes = orcamento_bytes
+        self.assinatura = assinatura_regras()
+
+    def caminho(self, identificador):
+        return os.path.join(self.diretorio, f"{identificador}-{self.assinatura}{EXTENSAO}")
+
+    def contem(self, identificador):
+        return os.path.exists(self.caminho(identificador))
+
+    # Retorna o DataFrame guardado (ou None) e atualiza a data de uso do arquivo
+    def obter(self, identificador):
+        caminho = self.caminho(identificador)
+        try:
+            tabela = feather.read_table(caminho, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(caminho)
+        df = tabela.to_pandas()
+        metadados = tabela.schema.metadata or {}
+        if CHAVE_METADADOS in metadados:
+            df.attrs = json.loads(metadados[CHAVE_METADADOS])
+        return df
+
+    # Grava o DataFrame (escrita atômica) e descarta os arquivos mais antigos acima do orçamento
+    # Cada gravação usa o próprio arquivo temporário (sessões ou tarefas podem gravar o mesmo arquivo ao mesmo tempo)
+    # O cache é só uma otimização: se a gravação falhar (disco cheio, pasta sem permissão), o DataFrame é devolvido assim mesmo
+    def guardar(self, identificador, df):
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[CHAVE_METADADOS] = json.dumps(df.attrs).encode("utf-8")
+        tabela = tabela.replace_schema_metadata(metadados)
+
+        caminho = self.caminho(identificador)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            feather.write_feather(tabela, temporario, compression="uncompressed")
+            os.replace(temporario, caminho)
+            self.limpar(manter=caminho)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temporario)
+        return df
+
+    # Retorna o DataFrame do cache ou executa carregar() e grava o resultado
+    def obter_ou_carregar(self, identificador, carregar):
+        df = self.obter(identificador)
+        if df is None:
+            df = self.guardar(identificador, carregar())
+        return df
+
+    # Remove arquivos de regras antigas e, se necessário, os menos usados até caber no orçamento
+    def limpar(self, manter=None):
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if not nome.endswith(EXTENSAO):
+                continue
+            caminho = os.path.join(self.diretorio, nome)
+            with contextlib.suppress(FileNotFoundError):
+                if not nome.endswith(f"-{self.assinatura}{EXTENSAO}"):
+                    os.remove(caminho)
+                    continue
+                estado = os.stat(caminho)
+                arquivos.append((estado.st_mtime, estado.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.orcamento_bytes:
+                break
+            if caminho == manter:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(caminho)
+            total -= tamanho
@@ -0,0 +1,134 @@
+import contextlib
+import hashlib
+import os
+import threading
+
+from armazem_dados import ArmazemDados, TAMANHO_IDENTIFICADOR
+from cache_disco import DIRETORIO_PADRAO, assinatura_regras
+
+# Versão das figuras e mapas; incremente ao mudar como são montados para invalidar os renders gravados em disco
+VERSAO_RENDER = 1
+
+# Memória para figuras (JSON) e mapas (HTML) já serializados (128 MB)
+ORCAMENTO_RENDER_BYTES = 128 * 1024 ** 2
+
+# Espaço em disco para os renders descartados da memória (1 GB)
+ORCAMENTO_DISCO_RENDER_BYTES = 1024 ** 3
+
+DIRETORIO_RENDER_PADRAO = os.path.join(DIRETORIO_PADRAO, "render")
+
+EXTENSAO_RENDER = ".render"
+
+
+# Função para gerar o identificador de um render a partir da chave (conjunto de dados, página, filtros, nome)
+def identificador_render(chave):
+    texto = repr((VERSAO_RENDER, assinatura_regras(), chave))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:TAMANHO_IDENTIFICADOR]
+
+
+# Função para gerar a ETag do conteúdo (muda só quando o texto muda)
+def etag_conteudo(texto):
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:TAMANHO_IDENTIFICADOR]
+
+
+# Cache das figuras e mapas já serializados (JSON do Plotly, HTML do Folium), com a ETag de cada um
+# Em memória com descarte LRU; com diretorio, os itens descartados vão para o disco e voltam no próximo uso
+class CacheRender:
+    def __init__(self, orcamento_bytes=ORCAMENTO_RENDER_BYTES, diretorio=None, orcamento_disco_bytes=ORCAMENTO_DISCO_RENDER_BYTES):
+        self.diretorio = diretorio
+        self.orcamento_disco_bytes = orcamento_disco_bytes
+        # Bytes dos renders em disco: lidos do diretório na primeira gravação e acompanhados a cada gravação
+        self._bytes_disco = None
+        self._trava_disco = threading.Lock()
+        self._memoria = ArmazemDados(
+            orcamento_bytes,
+            medir=lambda item: len(item[1]),
+            ao_descartar=self._gravar_disco if diretorio else None,
+        )
+
+    # Retorna (etag, texto) do render ou None; os lidos do disco voltam para a memória
+    def obter(self, identificador):
+        item = self._memoria.obter(identificador)
+        if item is None and self.diretorio:
+            item = self._ler_disco(identificador)
+            if item is not None:
+                self._memoria.guardar(identificador, item)
+        return item
+
+    # Retorna (identificador, etag, texto); renderizar() (que devolve o texto) só é chamado se o render não existir
+    def obter_ou_renderizar(self, chave, renderizar):
+        identificador = identificador_render(chave)
+        item = self.obter(identificador)
+        if item is None:
+            texto = renderizar()
+            item = self._memoria.guardar(identificador, (etag_conteudo(texto), texto))
+        return (identificador,) + item
+
+    def caminho(self, identificador):
+        return os.path.join(self.diretorio, f"{identificador}{EXTENSAO_RENDER}")
+
+    # Grava o render descartado da memória (primeira linha: ETag) e limpa os mais antigos acima do orçamento
+    # A gravação é só uma otimização: se falhar (disco cheio, diretório sem permissão), o render é descartado
+    def _gravar_disco(self, identificador, item):
+        etag, texto = item
+        caminho = self.caminho(identificador)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            with open(temporario, "w", encoding="utf-8") as handle:
+                handle.write(f"{etag}\n{texto}")
+            tamanho = os.path.getsize(temporario)
+            os.replace(temporario, caminho)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temporario)
+            return
+        with self._trava_disco:
+            if self._bytes_disco is None:
+                self._bytes_disco = self._medir_disco()
+            else:
+                self._bytes_disco += tamanho
+            acima_do_orcamento = self._bytes_disco > self.orcamento_disco_bytes
+        if acima_do_orcamento:
+            self._limpar_disco()
+
+    def _ler_disco(self, identificador):
+        caminho = self.caminho(identificador)
+        try:
+            with open(caminho, encoding="utf-8") as handle:
+                etag, texto = handle.read().split("\n", 1)
+        except (OSError, ValueError):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(caminho)
+        return etag, texto
+
+    # Lista os renders gravados no diretório: (último uso, tamanho, caminho)
+    def _arquivos_disco(self):
+        arquivos = []
+        with contextlib.suppress(OSError):
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(EXTENSAO_RENDER):
+                    caminho = os.path.join(self.diretorio, nome)
+                    with contextlib.suppress(OSError):
+                        estado = os.stat(caminho)
+                        arquivos.append((estado.st_mtime, estado.st_size, caminho))
+        return arquivos
+
+    def _medir_disco(self):
+        return sum(tamanho for _, tamanho, _ in self._arquivos_disco())
+
+    # Remove os renders usados há mais tempo até caber no orçamento em disco
+    # Só é chamada quando o total acompanhado passa do orçamento; a listagem corrige o total
+    # (o diretório pode ser usado por mais de um processo)
+    def _limpar_disco(self):
+        arquivos = self._arquivos_disco()
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.orcamento_disco_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(caminho)
+            total -= tamanho
+        with self._trava_disco:
+            self._bytes_disco = total
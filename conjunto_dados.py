@@ -0,0 +1,58 @@
+from armazem_dados import identificador_conteudo
+from ingestao import bytes_em_memoria, concatenar_blocos, ocorrencias_novas
+from indices import construir_indices, anexar_indices, bytes_indices
+from agregados import construir_cubo, anexar_ao_cubo, bytes_cubo
+
+
+# Função para gerar o identificador de um conjunto: o do próprio arquivo, ou o hash dos identificadores dos arquivos
+def identificador_conjunto(arquivos):
+    if len(arquivos) == 1:
+        return arquivos[0]
+    return identificador_conteudo("+".join(arquivos))
+
+
+# Conjunto de dados formado por um ou mais arquivos, com índices de filtro e cubo de contagens
+# Imutável: anexar um arquivo devolve um novo conjunto, reaproveitando o que já foi calculado
+class ConjuntoDados:
+    def __init__(self, arquivos, dados, indices, cubo):
+        self.arquivos = tuple(arquivos)
+        self.dados = dados
+        self.indices = indices
+        self.cubo = cubo
+
+    @property
+    def dataset_id(self):
+        return identificador_conjunto(self.arquivos)
+
+    # Cria o conjunto a partir de um único arquivo já limpo
+    @classmethod
+    def de_arquivo(cls, identificador, df):
+        df = df.reset_index(drop=True)
+        return cls([identificador], df, construir_indices(df), construir_cubo(df))
+
+    # Cria o conjunto a partir de pares (identificador, DataFrame), anexando na ordem recebida
+    @classmethod
+    def montar(cls, pares):
+        (identificador, df), *restantes = pares
+        return cls.de_arquivo(identificador, df).anexar_varios(restantes)
+
+    # Devolve um novo conjunto com as ocorrências do arquivo que ainda não estavam carregadas;
+    # índices e cubo são atualizados só com as linhas novas
+    def anexar(self, identificador, df):
+        if identificador in self.arquivos:
+            return self
+        novos = ocorrencias_novas(self.dados, df)
+        dados = concatenar_blocos([self.dados, novos])
+        indices = anexar_indices(self.indices, novos, len(self.dados))
+        cubo = anexar_ao_cubo(self.cubo, novos)
+        return ConjuntoDados(self.arquivos + (identificador,), dados, indices, cubo)
+
+    # Devolve um novo conjunto com os arquivos (pares identificador, DataFrame) anexados na ordem recebida
+    def anexar_varios(self, pares):
+        conjunto = self
+        for identificador, df in pares:
+            conjunto = conjunto.anexar(identificador, df)
+        return conjunto
+
+    def bytes(self):
+        return bytes_em_memoria(self.dados) + bytes_indices(self.indices) + bytes_cubo(self.cubo)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from mapas import centro_mapa, indices_celulas, tamanho_celula_por_zoom
+
+# Zoom que define o tamanho das células do mapa enviadas ao navegador
+ZOOM_CELULAS_NAVEGADOR = 13
+
+
+# Função para montar o payload único do conjunto de dados usado pelo filtro no navegador:
+# contagens por setor/unidade/natureza/dia e ocorrências somadas em células do mapa,
+# com os valores trocados por códigos (posições nas listas setores, unidades, naturezas)
+def montar_payload(conjunto, zoom=ZOOM_CELULAS_NAVEGADOR):
+    cubo = conjunto.cubo
+    dados = conjunto.dados
+
+    # As listas de valores vêm dos dados, para que cubo e células usem os mesmos códigos
+    setores = sorted(str(valor) for valor in dados["SETOR"].unique())
+    unidades = sorted(str(valor) for valor in dados["UNID_REGISTRO_NIVEL_6"].unique())
+    naturezas = sorted(str(valor) for valor in dados["CODIGO_NATUREZA_PRINCIPAL"].unique())
+
+    def codigos(serie, valores):
+        return pd.Categorical(serie.astype(str), categories=valores).codes.astype("int32")
+
+    # Contagens por setor, unidade, natureza e dia (dias contados a partir da primeira data)
+    contagens = cubo.groupby(["SETOR", "UNID_REGISTRO_NIVEL_6", "CODIGO_NATUREZA_PRINCIPAL", "DATA_FATO"],
+                             observed=True)["QUANTIDADE"].sum().reset_index()
+    contagens = contagens[contagens["QUANTIDADE"] > 0]
+    inicio = contagens["DATA_FATO"].min() if len(contagens) else pd.Timestamp(0)
+    dias = ((contagens["DATA_FATO"] - inicio) // pd.Timedelta(days=1)).to_numpy(dtype="int32")
+
+    # Células do mapa: ocorrências somadas por (célula, setor, unidade, natureza)
+    tamanho = tamanho_celula_por_zoom(zoom)
+    x, y = indices_celulas(
+        dados["LATITUDE"].to_numpy(dtype="float64"), dados["LONGITUDE"].to_numpy(dtype="float64"), tamanho,
+    )
+    celulas = pd.DataFrame({
+        "X": x, "Y": y,
+        "SETOR": codigos(dados["SETOR"], setores),
+        "UNIDADE": codigos(dados["UNID_REGISTRO_NIVEL_6"], unidades),
+        "NATUREZA": codigos(dados["CODIGO_NATUREZA_PRINCIPAL"], naturezas),
+    }).groupby(["X", "Y", "SETOR", "UNIDADE", "NATUREZA"]).size().reset_index(name="QUANTIDADE")
+
+    return {
+        "setores": setores,
+        "unidades": unidades,
+        "naturezas": naturezas,
+        "inicio": inicio.strftime("%Y-%m-%d"),
+        "centro": centro_mapa(dados),
+        "contagens": {
+            "setor": codigos(contagens["SETOR"], setores).tolist(),
+            "unidade": codigos(contagens["UNID_REGISTRO_NIVEL_6"], unidades).tolist(),
+            "natureza": codigos(contagens["CODIGO_NATUREZA_PRINCIPAL"], naturezas).tolist(),
+            "dia": dias.tolist(),
+            "quantidade": contagens["QUANTIDADE"].astype("int64").tolist(),
+        },
+        "celulas": {
+            # Centro de cada célula, com 5 casas decimais (≈ 1 m)
+            "lat": np.round((celulas["Y"].to_numpy() + 0.5) * tamanho, 5).tolist(),
+            "lon": np.round((celulas["X"].to_numpy() + 0.5) * tamanho, 5).tolist(),
+            "setor": celulas["SETOR"].tolist(),
+            "unidade": celulas["UNIDADE"].tolist(),
+            "natureza": celulas["NATUREZA"].tolist(),
+            "quantidade": celulas["QUANTIDADE"].tolist(),
+        },
+    }
@@ -0,0 +1,195 @@
+import branca.colormap as cm
+import folium
+import numpy as np
+import pandas as pd
+
+from mapas import centro_mapa
+
+METODOS_HOTSPOT = ["kde", "gi"]
+
+# Metros por grau de latitude (e de longitude no equador)
+METROS_POR_GRAU = 111_320
+
+# Tamanho padrão da célula da grade e raio padrão da vizinhança (banda do KDE / distância do Gi*), em metros
+CELULA_PADRAO_M = 250
+BANDA_PADRAO_M = 500
+
+# Limite de células da grade; acima dele a célula é aumentada (áreas muito grandes)
+LIMITE_CELULAS = 4_000_000
+
+# Faixas do z-score do Gi* (90%, 95% e 99% de confiança)
+FAIXAS_GI = [1.645, 1.96, 2.576]
+
+
+# Grade uniforme com as ocorrências contadas por célula: serve de índice espacial para KDE e Gi*
+# contagens[linha, coluna]: linha 0 é a mais ao sul; limites = (lat_min, lon_min, lat_max, lon_max)
+class GradeHotspot:
+    def __init__(self, contagens, limites, celula_m):
+        self.contagens = contagens
+        self.limites = limites
+        self.celula_m = celula_m
+
+    # Tamanho usado pelo armazém de etapas (sys.getsizeof) para medir a grade
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.contagens.nbytes
+
+
+# Função para selecionar as linhas por natureza e período (datas inclusivas; None não filtra)
+def mascara_hotspot(dados, naturezas=None, inicio=None, fim=None):
+    mascara = np.ones(len(dados), dtype=bool)
+    if naturezas:
+        mascara &= dados["CODIGO_NATUREZA_PRINCIPAL"].isin(naturezas).to_numpy()
+    datas = dados["DATA_FATO"]
+    if inicio is not None:
+        mascara &= (datas >= pd.Timestamp(inicio)).to_numpy()
+    if fim is not None:
+        mascara &= (datas <= pd.Timestamp(fim)).to_numpy()
+    return mascara
+
+
+# Função para contar as ocorrências em uma grade de células de celula_m metros (em projeção local)
+def contar_em_grade(latitudes, longitudes, celula_m=CELULA_PADRAO_M, limite_celulas=LIMITE_CELULAS):
+    lat_min, lat_max = float(latitudes.min()), float(latitudes.max())
+    lon_min, lon_max = float(longitudes.min()), float(longitudes.max())
+    fator_lon = np.cos(np.radians((lat_min + lat_max) / 2))
+    altura_m = (lat_max - lat_min) * METROS_POR_GRAU
+    largura_m = (lon_max - lon_min) * METROS_POR_GRAU * fator_lon
+    # Aumenta a célula se a grade passar do limite
+    celula_m = max(celula_m, np.sqrt(altura_m * largura_m / limite_celulas))
+
+    passo_lat = celula_m / METROS_POR_GRAU
+    passo_lon = celula_m / (METROS_POR_GRAU * fator_lon)
+    linhas = int(altura_m // celula_m) + 1
+    colunas = int(largura_m // celula_m) + 1
+    linha = ((latitudes - lat_min) / passo_lat).astype("int64").clip(0, linhas - 1)
+    coluna = ((longitudes - lon_min) / passo_lon).astype("int64").clip(0, colunas - 1)
+    contagens = np.bincount(linha * colunas + coluna, minlength=linhas * colunas).reshape(linhas, colunas).astype("float64")
+    limites = (lat_min, lon_min, lat_min + linhas * passo_lat, lon_min + colunas * passo_lon)
+    return GradeHotspot(contagens, limites, celula_m)
+
+
+# Função para aplicar um filtro 1D (pesos simétricos) ao longo de um eixo, com zeros fora da grade
+def _convoluir_eixo(valores, pesos, eixo):
+    raio = len(pesos) // 2
+    largura = [(0, 0), (0, 0)]
+    largura[eixo] = (raio, raio)
+    preenchido = np.pad(valores, largura)
+    resultado = np.zeros_like(valores)
+    tamanho = valores.shape[eixo]
+    for deslocamento, peso in enumerate(pesos):
+        fatia = [slice(None), slice(None)]
+        fatia[eixo] = slice(deslocamento, deslocamento + tamanho)
+        resultado += peso * preenchido[tuple(fatia)]
+    return resultado
+
+
+# Função para estimar a densidade (KDE gaussiano) sobre a grade, em ocorrências por km²
+# A gaussiana é separável: duas passadas 1D em vez de uma janela 2D
+def densidade_kde(grade, banda_m=BANDA_PADRAO_M):
+    sigma = max(banda_m / grade.celula_m, 0.5)
+    raio = int(np.ceil(3 * sigma))
+    pesos = np.exp(-0.5 * (np.arange(-raio, raio + 1) / sigma) ** 2)
+    pesos /= pesos.sum()
+    suavizado = _convoluir_eixo(_convoluir_eixo(grade.contagens, pesos, 0), pesos, 1)
+    return suavizado / (grade.celula_m / 1000) ** 2
+
+
+# Função para somar os valores numa janela quadrada de raio (em células) ao redor de cada célula,
+# usando a tabela de somas acumuladas (custo constante por célula, qualquer que seja o raio)
+def soma_janela(valores, raio):
+    linhas, colunas = valores.shape
+    acumulado = np.zeros((linhas + 1, colunas + 1))
+    acumulado[1:, 1:] = valores.cumsum(axis=0).cumsum(axis=1)
+    i = np.arange(linhas)
+    j = np.arange(colunas)
+    i0, i1 = np.clip(i - raio, 0, linhas)[:, None], np.clip(i + raio + 1, 0, linhas)[:, None]
+    j0, j1 = np.clip(j - raio, 0, colunas)[None, :], np.clip(j + raio + 1, 0, colunas)[None, :]
+    return acumulado[i1, j1] - acumulado[i0, j1] - acumulado[i1, j0] + acumulado[i0, j0]
+
+
+# Função para calcular o Gi* de Getis-Ord (z-score) de cada célula, com pesos binários:
+# vizinhas são as células a até distancia_m (janela quadrada, incluindo a própria célula)
+def estatistica_gi(grade, distancia_m=BANDA_PADRAO_M):
+    x = grade.contagens
+    n = x.size
+    raio = max(int(round(distancia_m / grade.celula_m)), 1)
+    media = x.mean()
+    desvio = np.sqrt((x ** 2).mean() - media ** 2)
+    vizinhas = soma_janela(np.ones_like(x), raio)
+    soma = soma_janela(x, raio)
+    denominador = desvio * np.sqrt((n * vizinhas - vizinhas ** 2) / (n - 1)) if n > 1 else np.zeros_like(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (soma - media * vizinhas) / denominador
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+# Função para calcular a superfície de hotspots: "kde" (ocorrências por km²) ou "gi" (z-score do Gi*)
+# Retorna (grade, superficie) ou (None, None) se não houver ocorrências
+def calcular_hotspots(dados, metodo="kde", celula_m=CELULA_PADRAO_M, banda_m=BANDA_PADRAO_M, naturezas=None, inicio=None, fim=None):
+    mascara = mascara_hotspot(dados, naturezas, inicio, fim)
+    if not mascara.any():
+        return None, None
+    grade = contar_em_grade(
+        dados["LATITUDE"].to_numpy(dtype="float64")[mascara], dados["LONGITUDE"].to_numpy(dtype="float64")[mascara], celula_m,
+    )
+    if metodo == "gi":
+        return grade, estatistica_gi(grade, banda_m)
+    return grade, densidade_kde(grade, banda_m)
+
+
+# Função para listar as células mais quentes (centro, valor e ocorrências), da maior para a menor
+def principais_hotspots(grade, superficie, quantidade=10):
+    lat_min, lon_min, lat_max, lon_max = grade.limites
+    linhas, colunas = superficie.shape
+    ordem = np.argsort(superficie, axis=None)[::-1][:quantidade]
+    linha, coluna = np.unravel_index(ordem, superficie.shape)
+    return pd.DataFrame({
+        "LATITUDE": np.round(lat_min + (linha + 0.5) * (lat_max - lat_min) / linhas, 5),
+        "LONGITUDE": np.round(lon_min + (coluna + 0.5) * (lon_max - lon_min) / colunas, 5),
+        "VALOR": np.round(superficie[linha, coluna], 2),
+        "OCORRENCIAS_CELULA": grade.contagens[linha, coluna].astype("int64"),
+    })
+
+
+# Função para converter a superfície em imagem RGBA: KDE em escala YlOrRd (transparente onde não há densidade);
+# Gi* em vermelho (hotspots) e azul (coldspots) com intensidade pela faixa de confiança
+def imagem_superficie(superficie, metodo):
+    imagem = np.zeros(superficie.shape + (4,))
+    if metodo == "gi":
+        for nivel, limite in enumerate(FAIXAS_GI, start=1):
+            alfa = 0.25 + 0.2 * nivel
+            imagem[superficie >= limite] = [0.84, 0.1, 0.1, alfa]
+            imagem[superficie <= -limite] = [0.13, 0.4, 0.67, alfa]
+    else:
+        maximo = superficie.max()
+        if maximo > 0:
+            escala = superficie / maximo
+            cores = cm.linear.YlOrRd_09
+            paleta = np.array([cores.rgb_bytes_tuple(valor) for valor in np.linspace(cores.vmin, cores.vmax, 256)]) / 255
+            imagem[..., :3] = paleta[(escala * 255).astype("int64")]
+            imagem[..., 3] = np.where(escala > 0.02, 0.3 + 0.5 * escala, 0)
+    # A linha 0 da grade é a mais ao sul; a imagem começa pelo norte
+    return imagem[::-1]
+
+
+# Função para criar o mapa com a superfície de hotspots como camada de imagem
+def criar_mapa_hotspots(dados, grade, superficie, metodo="kde", zoom_start=12):
+    mapa = folium.Map(location=centro_mapa(dados), zoom_start=zoom_start)
+    if grade is None:
+        return mapa
+    lat_min, lon_min, lat_max, lon_max = grade.limites
+    folium.raster_layers.ImageOverlay(
+        imagem_superficie(superficie, metodo),
+        bounds=[[lat_min, lon_min], [lat_max, lon_max]],
+        mercator_project=True,
+        pixelated=False,
+        name="Hotspots",
+    ).add_to(mapa)
+    if metodo == "gi":
+        legenda = cm.StepColormap(["#2166ac", "#ffffff", "#d6191b"], index=[-4, -FAIXAS_GI[1], FAIXAS_GI[1], 4], vmin=-4, vmax=4)
+        legenda.caption = "Gi* (z-score): azul = coldspot, vermelho = hotspot (95%)"
+    else:
+        legenda = cm.linear.YlOrRd_09.scale(0, float(superficie.max()))
+        legenda.caption = "Densidade de ocorrências (por km²)"
+    legenda.add_to(mapa)
+    return mapa
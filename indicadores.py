@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Base das taxas por habitantes do IMV e do IMT
+HABITANTES_BASE = 100000
+
+# Colunas de quantidade usadas por cada indicador
+COLUNAS_TAXA = {"IMV": "QTD_IMV", "IMT": "QTD_IMT"}
+COLUNAS_ICCP = ["FURTO", "ROUBO", "EXTORSAO"]
+
+
+# Função para truncar valores na 2ª casa decimal (escalar ou array; divisões por zero ficam NaN)
+def truncar(valor, casas=2):
+    fator = 10 ** casas
+    with np.errstate(invalid="ignore"):
+        truncado = np.trunc(np.asarray(valor, dtype="float64") * fator) / fator
+    if isinstance(valor, pd.Series):
+        return pd.Series(truncado, index=valor.index, name=valor.name)
+    return truncado if truncado.ndim else float(truncado)
+
+
+# Função para dividir sem erro: onde o divisor é zero (ou ausente) o resultado é NaN
+def _dividir(numerador, denominador):
+    numerador = np.asarray(numerador, dtype="float64")
+    denominador = np.asarray(denominador, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominador > 0, numerador / denominador, np.nan)
+
+
+# Função para calcular a taxa por 100 mil habitantes (IMV e IMT): valor / POP * 100000
+def taxa_por_habitantes(quantidade, populacao):
+    return _dividir(quantidade, populacao) * HABITANTES_BASE
+
+
+# Função para calcular o fator F ∝ R (FURTO / ROUBO)
+def fator_furto_roubo(furto, roubo):
+    return _dividir(furto, roubo)
+
+
+# Função para calcular o ICCP: ((ROUBO · F ∝ R) + (EXTORSÃO · F ∝ R) + FURTO) / POP · 100
+def indice_iccp(furto, roubo, extorsao, fator, populacao):
+    furto, roubo, extorsao, fator = (np.asarray(valor, dtype="float64") for valor in (furto, roubo, extorsao, fator))
+    return _dividir(roubo * fator + extorsao * fator + furto, populacao) * 100
+
+
+# Função para calcular a variação percentual em relação ao ano anterior: (atual - anterior) / anterior · 100
+def variacao(atual, anterior):
+    return _dividir(np.asarray(atual, dtype="float64") - np.asarray(anterior, dtype="float64"), anterior) * 100
+
+
+# Função para calcular todos os indicadores de uma vez, para muitos locais e anos
+# dados: uma linha por (chaves, ano) com a população (POP) e as quantidades disponíveis
+# (QTD_IMV, QTD_IMT, FURTO, ROUBO, EXTORSAO); indicadores sem as colunas necessárias são ignorados
+# O F ∝ R de um ano usa FURTO e ROUBO do ano anterior, como no app_mv.py, e as variações
+# comparam com o ano imediatamente anterior do mesmo local (NaN quando ele não existe)
+def calcular_indicadores(dados, chaves=None, ano="ANO", populacao="POP"):
+    chaves = list(chaves or [])
+    resultado = dados.sort_values(chaves + [ano], kind="stable").reset_index(drop=True)
+    colunas = [coluna for coluna in list(COLUNAS_TAXA.values()) + COLUNAS_ICCP if coluna in resultado.columns]
+
+    # Valores do ano anterior do mesmo local, alinhados linha a linha
+    anterior = resultado.groupby(chaves, sort=False)[[ano] + colunas].shift(1) if chaves else resultado[[ano] + colunas].shift(1)
+    consecutivo = anterior[ano] == resultado[ano] - 1
+    anterior = anterior[colunas].where(consecutivo, axis=0)
+
+    for indicador, coluna in COLUNAS_TAXA.items():
+        if coluna in resultado.columns:
+            resultado[indicador] = truncar(taxa_por_habitantes(resultado[coluna], resultado[populacao]))
+
+    if all(coluna in resultado.columns for coluna in COLUNAS_ICCP):
+        # O fator é truncado antes de entrar no ICCP, como no cálculo manual
+        resultado["F_R"] = truncar(fator_furto_roubo(anterior["FURTO"], anterior["ROUBO"]))
+        resultado["ICCP"] = truncar(indice_iccp(
+            resultado["FURTO"], resultado["ROUBO"], resultado["EXTORSAO"], resultado["F_R"], resultado[populacao]
+        ))
+
+    for coluna in colunas:
+        resultado[f"VAR_{coluna}"] = truncar(variacao(resultado[coluna], anterior[coluna]))
+    return resultado
+
+
+# Função para contar as ocorrências de um DataFrame carregado (carregar_dados) por local e ano
+# grupos: {coluna de saída: códigos de natureza}; sem grupos, conta todas as linhas em QUANTIDADE
+# Lembre que a ingestão mantém só os crimes violentos do arquivo
+def contagens_por_ano(df, chaves=("SETOR",), grupos=None, ano="ANO"):
+    chaves = list(chaves)
+    base = df[chaves].copy()
+    base[ano] = df["DATA_FATO"].dt.year.astype("int32")
+    if grupos is None:
+        grupos = {"QUANTIDADE": None}
+    for coluna, codigos in grupos.items():
+        base[coluna] = 1 if codigos is None else df["CODIGO_NATUREZA_PRINCIPAL"].isin(codigos).to_numpy().astype("int32")
+    contagens = base.groupby(chaves + [ano], observed=True)[list(grupos)].sum()
+    return contagens.reset_index()
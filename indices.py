@@ -0,0 +1,78 @@
+import numpy as np
+
+# Colunas que recebem índice de filtro
+COLUNAS_INDEXADAS = ["SETOR", "UNID_REGISTRO_NIVEL_6", "CODIGO_NATUREZA_PRINCIPAL"]
+
+
+# Função para montar o índice de uma coluna: valor -> posições (ordenadas) das linhas com esse valor
+def indexar_coluna(serie):
+    categorias = serie.astype("category")
+    codigos = categorias.cat.codes.to_numpy()
+    # Ordenação estável: dentro de cada valor as posições ficam em ordem crescente
+    ordem = np.argsort(codigos, kind="stable")
+    if len(ordem) < 2 ** 31:
+        ordem = ordem.astype("int32")
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(categorias.cat.categories))
+    inicio = np.count_nonzero(codigos < 0)
+    listas = np.split(ordem[inicio:], np.cumsum(contagens)[:-1])
+    return {
+        valor: posicoes
+        for valor, posicoes in zip(categorias.cat.categories, listas)
+        if len(posicoes)
+    }
+
+
+# Função para montar os índices de todas as colunas de filtro (uma vez por conjunto de dados)
+def construir_indices(df):
+    return {coluna: indexar_coluna(df[coluna]) for coluna in COLUNAS_INDEXADAS if coluna in df.columns}
+
+
+# Função para medir a memória ocupada pelos índices
+def bytes_indices(indices):
+    return sum(posicoes.nbytes for indice in indices.values() for posicoes in indice.values())
+
+
+# Função para listar os valores de uma coluna (opções dos filtros)
+def opcoes(indices, coluna):
+    return sorted(indices[coluna])
+
+
+# Função para obter as posições das linhas que atendem às seleções
+# selecoes: {coluna: lista de valores}; listas vazias ou None não filtram a coluna
+# Retorna None quando nenhuma coluna é filtrada (todas as linhas)
+def posicoes_filtradas(indices, selecoes):
+    resultado = None
+    for coluna, valores in selecoes.items():
+        if not valores:
+            continue
+        indice = indices[coluna]
+        listas = [indice[valor] for valor in valores if valor in indice]
+        # As listas de valores diferentes são disjuntas: a união é só concatenar e ordenar
+        uniao = np.sort(np.concatenate(listas)) if listas else np.empty(0, dtype="int64")
+        resultado = uniao if resultado is None else np.intersect1d(resultado, uniao, assume_unique=True)
+    return resultado
+
+
+# Função para aplicar as seleções ao DataFrame usando os índices
+def filtrar(df, indices, selecoes):
+    posicoes = posicoes_filtradas(indices, selecoes)
+    if posicoes is None:
+        return df
+    return df.iloc[posicoes]
+
+
+
+# Função para atualizar os índices com linhas anexadas ao final do DataFrame (a partir de deslocamento)
+def anexar_indices(indices, novos, deslocamento):
+    indices_novos = construir_indices(novos)
+    resultado = {}
+    for coluna, indice in indices.items():
+        combinado = dict(indice)
+        for valor, posicoes in indices_novos.get(coluna, {}).items():
+            posicoes = posicoes.astype("int64") + deslocamento
+            if valor in combinado:
+                # As novas posições são todas maiores que as antigas: a lista continua ordenada
+                posicoes = np.concatenate([combinado[valor], posicoes])
+            combinado[valor] = posicoes
+        resultado[coluna] = combinado
+    return resultado
@@ -0,0 +1,338 @@
+import codecs
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrumentacao import registrar_etapa
+
+# Colunas obrigatórias do arquivo exportado do SiGOp
+COLUNAS_NECESSARIAS = {"LATITUDE", "LONGITUDE", "DATA_FATO", "CODIGO_NATUREZA_PRINCIPAL", "SETOR", "UNID_REGISTRO_NIVEL_6"}
+
+# Número da ocorrência, usado para reconhecer a mesma ocorrência em exportações que se sobrepõem
+COLUNA_ID_OCORRENCIA = "NUMERO_OCORRENCIA"
+
+# Colunas opcionais usadas pelas páginas (gráfico de crimes por mês) e pela remoção de duplicadas
+COLUNAS_OPCIONAIS = {"MES_DESCRICAO", COLUNA_ID_OCORRENCIA}
+
+# Naturezas consideradas crimes violentos
+NATUREZAS_CRIMES_VIOLENTOS = {"B01121", "B02001", "B01148", "C01157", "C01158", "D01213", "D01217", "C01159"}
+
+MENSAGEM_COLUNAS_AUSENTES = "O arquivo CSV deve conter as colunas necessárias: LATITUDE, LONGITUDE, DATA_FATO, CODIGO_NATUREZA_PRINCIPAL, SETOR e UNID_REGISTRO_NIVEL_6."
+
+# Versão das regras de limpeza; incremente ao mudar limpar_bloco ou compactar_bloco
+# para invalidar os arquivos já guardados no cache em disco
+VERSAO_LIMPEZA = 3
+
+# Quantidade de linhas lidas por vez; o pico de memória acompanha este valor
+TAMANHO_BLOCO_PADRAO = 100_000
+
+# Quantidade de processos da leitura em paralelo (padrão: todos os núcleos)
+PROCESSOS_PADRAO = int(os.environ.get("ANALISE_CV_PROCESSOS", 0)) or os.cpu_count() or 1
+
+# Tamanho a partir do qual a leitura em paralelo compensa o custo de iniciar os processos
+LIMITE_BYTES_PARALELO = 64 * 1024 ** 2
+
+# Tamanho da amostra do início do arquivo usada para detectar a codificação (UTF-8 ou Latin-1)
+TAMANHO_AMOSTRA_CODIFICACAO = 1024 ** 2
+
+# Todas as colunas lidas como texto: a limpeza faz as conversões
+TIPOS_LEITURA = {coluna: str for coluna in COLUNAS_NECESSARIAS | COLUNAS_OPCIONAIS}
+
+# Esquema compacto do DataFrame final: códigos como categorias e coordenadas em float32
+COLUNAS_CATEGORICAS = ["SETOR", "UNID_REGISTRO_NIVEL_6", "MES_DESCRICAO"]
+TIPO_NATUREZA = pd.CategoricalDtype(sorted(NATUREZAS_CRIMES_VIOLENTOS))
+
+# Colunas do DataFrame final, sempre nesta ordem: arquivos com as colunas em outra ordem
+# (ou sem MES_DESCRICAO) podem ser combinados
+COLUNAS_COMPACTAS = [
+    "DATA_FATO", "MES_DESCRICAO", "CODIGO_NATUREZA_PRINCIPAL", "SETOR", "UNID_REGISTRO_NIVEL_6",
+    "LATITUDE", "LONGITUDE", "CHAVE_OCORRENCIA",
+]
+
+
+# Função para aplicar o filtro de crimes violentos e a limpeza em um bloco do CSV
+def limpar_bloco(df):
+    df = df[df["CODIGO_NATUREZA_PRINCIPAL"].isin(NATUREZAS_CRIMES_VIOLENTOS)].copy()
+
+    # Converte DATA_FATO para datetime
+    df["DATA_FATO"] = pd.to_datetime(df["DATA_FATO"], format="%d/%m/%Y", errors="coerce")
+
+    # Limpa e converte LATITUDE e LONGITUDE para valores numéricos
+    df["LATITUDE"] = pd.to_numeric(df["LATITUDE"].str.replace(",", ".", regex=False), errors="coerce")
+    df["LONGITUDE"] = pd.to_numeric(df["LONGITUDE"].str.replace(",", ".", regex=False), errors="coerce")
+
+    # Remove linhas com valores inválidos
+    return df.dropna(subset=["LATITUDE", "LONGITUDE", "DATA_FATO"])
+
+
+# Função para calcular a chave de 64 bits de cada ocorrência: o hash do número da ocorrência
+# ou, se o arquivo não o tiver, o hash das colunas obrigatórias já limpas
+def chave_ocorrencia(df):
+    if COLUNA_ID_OCORRENCIA in df.columns:
+        return pd.util.hash_pandas_object(df[COLUNA_ID_OCORRENCIA], index=False).to_numpy()
+    return pd.util.hash_pandas_object(df[sorted(COLUNAS_NECESSARIAS)], index=False).to_numpy()
+
+
+# Função para converter um bloco limpo para o esquema compacto
+def compactar_bloco(df):
+    df = df.copy()
+    df["CHAVE_OCORRENCIA"] = chave_ocorrencia(df)
+    df = df.drop(columns=[COLUNA_ID_OCORRENCIA], errors="ignore")
+    df["CODIGO_NATUREZA_PRINCIPAL"] = df["CODIGO_NATUREZA_PRINCIPAL"].astype(TIPO_NATUREZA)
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype("category")
+        else:
+            # Coluna opcional ausente no arquivo: categoria vazia (todos os valores nulos)
+            df[coluna] = pd.Categorical.from_codes(np.full(len(df), -1), categories=[])
+    df["LATITUDE"] = df["LATITUDE"].astype("float32")
+    df["LONGITUDE"] = df["LONGITUDE"].astype("float32")
+    df["DATA_FATO"] = df["DATA_FATO"].dt.normalize()
+    return df[COLUNAS_COMPACTAS]
+
+
+# Função para medir a memória ocupada pelo DataFrame
+def bytes_em_memoria(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+# Função para juntar blocos compactos, unificando as categorias de cada coluna
+def concatenar_blocos(blocos):
+    if any(set(bloco.columns) != set(blocos[0].columns) for bloco in blocos):
+        raise ValueError("Os arquivos precisam ter as mesmas colunas para serem combinados.")
+    blocos = [bloco[list(blocos[0].columns)] for bloco in blocos]
+    colunas = {}
+    for coluna in blocos[0].columns:
+        partes = [bloco[coluna] for bloco in blocos]
+        if isinstance(partes[0].dtype, pd.CategoricalDtype) and coluna != "CODIGO_NATUREZA_PRINCIPAL":
+            # Categorias ordenadas: o resultado não depende de como o arquivo foi dividido em blocos
+            colunas[coluna] = pd.Categorical(union_categoricals(partes, sort_categories=True))
+        else:
+            colunas[coluna] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+
+# Função para descobrir o tamanho total do arquivo (usado na barra de progresso)
+def _tamanho_arquivo(arquivo):
+    if isinstance(arquivo, (str, os.PathLike)):
+        return os.path.getsize(arquivo)
+    try:
+        posicao = arquivo.tell()
+        arquivo.seek(0, os.SEEK_END)
+        tamanho = arquivo.tell()
+        arquivo.seek(posicao)
+        return tamanho
+    except (AttributeError, OSError):
+        return None
+
+
+# Função para escolher a codificação de um trecho de bytes: UTF-8 (com ou sem BOM) se for válido, senão Latin-1
+def codificacao_amostra(amostra):
+    if amostra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.decode(amostra, "utf-8")
+    except UnicodeDecodeError as erro:
+        # A amostra pode ter sido cortada no meio de um caractere
+        if erro.reason != "unexpected end of data":
+            return "latin-1"
+    return "utf-8"
+
+
+# Função para descobrir a codificação do arquivo: a informada no atributo encoding
+# (ex.: pelo decodificador do upload, que já validou o arquivo inteiro) ou a de uma amostra do início
+def detectar_codificacao(arquivo):
+    codificacao = getattr(arquivo, "encoding", None)
+    if codificacao:
+        return codificacao
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, "rb") as handle:
+            return codificacao_amostra(handle.read(TAMANHO_AMOSTRA_CODIFICACAO))
+    if hasattr(arquivo, "getbuffer"):
+        return codificacao_amostra(bytes(arquivo.getbuffer()[:TAMANHO_AMOSTRA_CODIFICACAO]))
+    posicao = arquivo.tell()
+    amostra = arquivo.read(TAMANHO_AMOSTRA_CODIFICACAO)
+    arquivo.seek(posicao)
+    return codificacao_amostra(amostra)
+
+
+# Função para ler o CSV em blocos, mantendo apenas as colunas e linhas necessárias
+# progresso(fracao, linhas_lidas) é chamado após cada bloco; fracao é None se o tamanho for desconhecido
+# codificacao: None detecta pelo início do arquivo; se aparecer um byte inválido depois da amostra,
+# o arquivo é relido como Latin-1 (as exportações do SiGOp costumam vir nessa codificação)
+def ler_csv_em_blocos(arquivo, tamanho_bloco=TAMANHO_BLOCO_PADRAO, progresso=None, codificacao=None):
+    codificacao = codificacao or detectar_codificacao(arquivo)
+    total = _tamanho_arquivo(arquivo)
+    handle = open(arquivo, "rb") if isinstance(arquivo, (str, os.PathLike)) else arquivo
+    if hasattr(handle, "seek"):
+        handle.seek(0)
+    try:
+        leitor = pd.read_csv(
+            handle,
+            delimiter=";",
+            usecols=lambda coluna: coluna in TIPOS_LEITURA,
+            dtype=TIPOS_LEITURA,
+            chunksize=tamanho_bloco,
+            encoding=codificacao,
+        )
+        blocos = []
+        linhas_lidas = 0
+        bytes_antes = 0
+        segundos_limpeza = 0.0
+        with leitor:
+            for bloco in leitor:
+                if not COLUNAS_NECESSARIAS.issubset(bloco.columns):
+                    raise ValueError(MENSAGEM_COLUNAS_AUSENTES)
+                linhas_lidas += len(bloco)
+                inicio = time.perf_counter()
+                bloco = limpar_bloco(bloco)
+                bytes_antes += bytes_em_memoria(bloco)
+                blocos.append(compactar_bloco(bloco))
+                segundos_limpeza += time.perf_counter() - inicio
+                if progresso is not None:
+                    fracao = min(handle.tell() / total, 1.0) if total else None
+                    progresso(fracao, linhas_lidas)
+    except UnicodeDecodeError:
+        if codecs.lookup(codificacao).name == "iso8859-1":
+            raise
+        return ler_csv_em_blocos(arquivo, tamanho_bloco, progresso, codificacao="latin-1")
+    finally:
+        if handle is not arquivo:
+            handle.close()
+
+    if not blocos:
+        raise ValueError(MENSAGEM_COLUNAS_AUSENTES)
+    df = concatenar_blocos(blocos)
+    # Limpeza e leitura acontecem intercaladas, bloco a bloco: o tempo de limpeza é somado à parte
+    registrar_etapa("limpar", segundos_limpeza, linhas_lidas, len(df))
+
+    # Relatório de memória por linha antes e depois da conversão de tipos
+    linhas = max(len(df), 1)
+    df.attrs["bytes_por_linha"] = {"antes": bytes_antes / linhas, "depois": bytes_em_memoria(df) / linhas}
+    df.attrs["linhas_lidas"] = linhas_lidas
+    return df
+
+
+# Função para encontrar os pontos de corte do arquivo em quebras de linha, logo após o cabeçalho
+# (supõe que os campos não tenham quebras de linha entre aspas, como nas exportações do SiGOp)
+def _faixas_de_linhas(conteudo, partes):
+    inicio = conteudo.find(b"\n") + 1
+    if inicio == 0:
+        return conteudo[:], []
+    cortes = [inicio]
+    passo = max((len(conteudo) - inicio) // partes, 1)
+    for parte in range(1, partes):
+        corte = conteudo.find(b"\n", max(inicio + parte * passo, cortes[-1])) + 1
+        if corte == 0:
+            break
+        if corte > cortes[-1]:
+            cortes.append(corte)
+    cortes.append(len(conteudo))
+    faixas = [(a, b) for a, b in zip(cortes, cortes[1:]) if b > a]
+    return conteudo[:inicio], faixas
+
+
+# Função executada em cada processo: lê uma faixa de linhas do arquivo com o cabeçalho
+def _ler_faixa(cabecalho, caminho, inicio, fim, codificacao):
+    with open(caminho, "rb") as handle:
+        handle.seek(inicio)
+        faixa = handle.read(fim - inicio)
+    return ler_csv_em_blocos(io.BytesIO(cabecalho + faixa), codificacao=codificacao)
+
+
+# Função para ler o CSV em paralelo: divide o arquivo em faixas alinhadas a quebras de linha,
+# limpa cada faixa em um processo e junta os resultados na ordem original do arquivo
+# O DataFrame resultante é idêntico ao de ler_csv_em_blocos
+def ler_csv_paralelo(arquivo, processos=PROCESSOS_PADRAO, progresso=None, codificacao=None):
+    # A codificação é decidida uma vez, pelo início do arquivo, e vale para todas as faixas
+    codificacao = codificacao or detectar_codificacao(arquivo)
+    if not isinstance(arquivo, (str, os.PathLike)):
+        # Upload em memória: gravado uma vez em um arquivo temporário, sem cópias do conteúdo;
+        # cada processo lê a sua faixa do disco, como com um arquivo local
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, "upload.csv")
+            with open(caminho, "wb") as handle:
+                if hasattr(arquivo, "getbuffer"):
+                    with arquivo.getbuffer() as conteudo:
+                        handle.write(conteudo)
+                else:
+                    arquivo.seek(0)
+                    shutil.copyfileobj(arquivo, handle)
+            return ler_csv_paralelo(caminho, processos, progresso, codificacao)
+
+    with open(arquivo, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as conteudo:
+        cabecalho, faixas = _faixas_de_linhas(conteudo, processos * 2)
+    tarefas = [(cabecalho, arquivo, inicio, fim, codificacao) for inicio, fim in faixas]
+
+    if not tarefas:
+        return ler_csv_em_blocos(io.BytesIO(cabecalho), codificacao=codificacao)
+
+    resultados = [None] * len(tarefas)
+    linhas_lidas = 0
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = {executor.submit(_ler_faixa, *tarefa): posicao for posicao, tarefa in enumerate(tarefas)}
+        try:
+            for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+                resultados[futuros[futuro]] = futuro.result()
+                linhas_lidas += resultados[futuros[futuro]].attrs["linhas_lidas"]
+                if progresso is not None:
+                    progresso(concluidas / len(tarefas), linhas_lidas)
+        except BaseException:
+            # Erro ou interrupção pedida pelo progresso (ex.: cancelamento): as faixas na fila não são lidas
+            for pendente in futuros:
+                pendente.cancel()
+            raise
+
+    df = concatenar_blocos(resultados)
+    linhas = max(len(df), 1)
+    bytes_antes = sum(parte.attrs["bytes_por_linha"]["antes"] * max(len(parte), 1) for parte in resultados)
+    df.attrs["bytes_por_linha"] = {"antes": bytes_antes / linhas, "depois": bytes_em_memoria(df) / linhas}
+    df.attrs["linhas_lidas"] = linhas_lidas
+    return df
+
+
+# Função para ler o CSV escolhendo o caminho: em paralelo para arquivos grandes, em blocos para os demais
+def ler_csv(arquivo, processos=PROCESSOS_PADRAO, progresso=None):
+    tamanho = _tamanho_arquivo(arquivo)
+    if processos > 1 and tamanho is not None and tamanho >= LIMITE_BYTES_PARALELO:
+        return ler_csv_paralelo(arquivo, processos=processos, progresso=progresso)
+    return ler_csv_em_blocos(arquivo, progresso=progresso)
+
+
+# Função para ler vários arquivos em paralelo; o resultado segue a ordem de entrada
+# progresso(fracao, arquivos_concluidos) é chamado na thread de quem chamou a função
+def ler_varios_csv(arquivos, max_workers=None, progresso=None):
+    resultados = [None] * len(arquivos)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(ler_csv_em_blocos, arquivo): posicao for posicao, arquivo in enumerate(arquivos)}
+        try:
+            for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                posicao = futuros[futuro]
+                try:
+                    resultados[posicao] = futuro.result()
+                except ValueError as erro:
+                    nome = getattr(arquivos[posicao], "name", arquivos[posicao])
+                    raise ValueError(f"{nome}: {erro}") from erro
+                if progresso is not None:
+                    progresso(concluidos / len(arquivos), concluidos)
+        except BaseException:
+            # Os arquivos ainda na fila não são lidos
+            for pendente in futuros:
+                pendente.cancel()
+            raise
+    return resultados
+
+
+# Função para separar as linhas de um novo arquivo que ainda não estão no conjunto já carregado
+# (ocorrências repetidas dentro do mesmo arquivo são mantidas, como na leitura de um arquivo só)
+def ocorrencias_novas(existente, novo):
+    repetidas = np.isin(novo["CHAVE_OCORRENCIA"].to_numpy(), existente["CHAVE_OCORRENCIA"].to_numpy())
+    return novo[~repetidas].reset_index(drop=True)
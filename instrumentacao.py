@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Histórico das últimas execuções (reruns do Streamlit / callbacks do Dash)
+TAMANHO_HISTORICO = 50
+
+historico = deque(maxlen=TAMANHO_HISTORICO)
+_trava = threading.Lock()
+_local = threading.local()
+
+# Log estruturado: uma linha JSON por execução; ANALISE_CV_LOG aponta o arquivo de log
+logger = logging.getLogger("analise_cv.instrumentacao")
+if os.environ.get("ANALISE_CV_LOG"):
+    _handler = logging.FileHandler(os.environ["ANALISE_CV_LOG"], encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+# Função para ligar ou desligar a medição do pico de memória (tracemalloc)
+# A medição deixa o código Python mais lento e é global ao processo: com várias
+# requisições simultâneas, o pico de uma etapa inclui o que as outras alocarem
+def medir_memoria(ativar=True):
+    if ativar and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not ativar and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if os.environ.get("ANALISE_CV_MEMORIA") == "1":
+    medir_memoria(True)
+
+
+def _pilha():
+    if not hasattr(_local, "pilha"):
+        _local.pilha = []
+    return _local.pilha
+
+
+# Função para iniciar o registro de uma execução; uma execução anterior não finalizada
+# (ex.: rerun interrompido do Streamlit) é descartada
+def iniciar_execucao(nome):
+    _local.pilha = []
+    _local.execucao = {
+        "execucao": nome,
+        "inicio": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "etapas": [],
+        "_relogio": time.perf_counter(),
+    }
+
+
+# Função para encerrar a execução atual, guardá-la no histórico e gravá-la no log
+def finalizar_execucao():
+    execucao = getattr(_local, "execucao", None)
+    if execucao is None:
+        return None
+    _local.execucao = None
+    execucao["segundos"] = round(time.perf_counter() - execucao.pop("_relogio"), 6)
+    with _trava:
+        historico.append(execucao)
+    logger.info(json.dumps(execucao, ensure_ascii=False, default=str))
+    return execucao
+
+
+# Contexto para registrar uma execução inteira (ex.: um callback do Dash)
+@contextmanager
+def execucao(nome):
+    iniciar_execucao(nome)
+    try:
+        yield
+    finally:
+        finalizar_execucao()
+
+
+def _registrar(registro):
+    execucao = getattr(_local, "execucao", None)
+    if execucao is not None:
+        execucao["etapas"].append(registro)
+
+
+# Função para registrar uma etapa medida fora de um contexto (ex.: tempo acumulado em vários blocos)
+def registrar_etapa(nome, segundos, linhas_entrada=None, linhas_saida=None):
+    _registrar({
+        "etapa": nome,
+        "nivel": len(_pilha()),
+        "segundos": round(segundos, 6),
+        "linhas_entrada": linhas_entrada,
+        "linhas_saida": linhas_saida,
+        "pico_memoria_mb": None,
+    })
+
+
+# Contexto para medir uma etapa: tempo, linhas de entrada/saída e pico de memória
+# Uso: with etapa("filtrar", len(dados)) as registro: ...; registro["linhas_saida"] = len(resultado)
+@contextmanager
+def etapa(nome, linhas_entrada=None):
+    pilha = _pilha()
+    registro = {"etapa": nome, "nivel": len(pilha), "linhas_entrada": linhas_entrada, "linhas_saida": None}
+    rastreando = tracemalloc.is_tracing()
+    if rastreando:
+        # O pico é zerado a cada etapa; o pico já atingido pela etapa de fora é guardado antes
+        atual, pico = tracemalloc.get_traced_memory()
+        if pilha:
+            pilha[-1]["_pico"] = max(pilha[-1]["_pico"], pico)
+        tracemalloc.reset_peak()
+        registro["_base"] = registro["_pico"] = atual
+
+    # Registrada já na entrada, para que a tabela siga a ordem em que as etapas começaram
+    _registrar(registro)
+    pilha.append(registro)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 6)
+        pilha.pop()
+        registro["pico_memoria_mb"] = None
+        if rastreando and tracemalloc.is_tracing():
+            pico = max(tracemalloc.get_traced_memory()[1], registro.pop("_pico"))
+            registro["pico_memoria_mb"] = round((pico - registro.pop("_base")) / 1024 ** 2, 3)
+            if pilha:
+                pilha[-1]["_pico"] = max(pilha[-1]["_pico"], pico)
+        registro.pop("_pico", None)
+        registro.pop("_base", None)
+
+
+# Função para obter o histórico recente como linhas de tabela (uma por etapa, mais recente primeiro)
+def tabela_historico():
+    with _trava:
+        execucoes = list(historico)
+    linhas = []
+    for execucao in reversed(execucoes):
+        for registro in execucao["etapas"]:
+            linhas.append({
+                "execucao": execucao["execucao"],
+                "inicio": execucao["inicio"],
+                "etapa": "  " * registro["nivel"] + registro["etapa"],
+                "segundos": registro["segundos"],
+                "linhas_entrada": registro["linhas_entrada"],
+                "linhas_saida": registro["linhas_saida"],
+                "pico_memoria_mb": registro["pico_memoria_mb"],
+            })
+        linhas.append({
+            "execucao": execucao["execucao"],
+            "inicio": execucao["inicio"],
+            "etapa": "TOTAL",
+            "segundos": execucao["segundos"],
+            "linhas_entrada": None,
+            "linhas_saida": None,
+            "pico_memoria_mb": None,
+        })
+    return linhas
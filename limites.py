@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import etapa
+
+# GeoJSON local com os limites dos setores usado quando nenhum arquivo é enviado pelo aplicativo
+ARQUIVO_LIMITES_PADRAO = os.environ.get("ANALISE_CV_LIMITES")
+
+# Propriedade do GeoJSON com o nome do setor (a primeira encontrada é usada)
+PROPRIEDADES_NOME = ["SETOR", "setor", "NOME", "nome", "name"]
+
+# Quantidade aproximada de células do índice espacial por polígono
+CELULAS_POR_POLIGONO = 16
+
+# Valor atribuído aos pontos que não caem em nenhum polígono
+FORA_DOS_LIMITES = "FORA DOS LIMITES"
+
+
+# Polígonos (setores) lidos do GeoJSON: nomes, anéis de cada polígono (arrays [lon, lat], externos e buracos)
+# e a caixa envolvente de cada um (lon_min, lat_min, lon_max, lat_max)
+class Limites:
+    def __init__(self, nomes, aneis, caixas):
+        self.nomes = nomes
+        self.aneis = aneis
+        self.caixas = caixas
+
+    def __len__(self):
+        return len(self.nomes)
+
+
+# Função para ler o GeoJSON (FeatureCollection de Polygon/MultiPolygon) com os limites dos setores
+# origem: caminho, arquivo aberto ou bytes; propriedade: nome da propriedade com o setor (None: detecta)
+def carregar_limites(origem, propriedade=None):
+    if isinstance(origem, (bytes, bytearray)):
+        colecao = json.loads(origem)
+    elif hasattr(origem, "read"):
+        colecao = json.load(origem)
+    else:
+        with open(origem, encoding="utf-8") as handle:
+            colecao = json.load(handle)
+
+    if not isinstance(colecao, dict):
+        raise ValueError("O GeoJSON deve ser uma FeatureCollection.")
+    nomes, aneis, caixas = [], [], []
+    for feicao in colecao.get("features", []):
+        geometria = (feicao.get("geometry") if isinstance(feicao, dict) else None) or {}
+        if geometria.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        propriedades = feicao.get("properties") or {}
+        chave = propriedade or next((nome for nome in PROPRIEDADES_NOME if nome in propriedades), None)
+        if chave is None or chave not in propriedades:
+            raise ValueError(f"O GeoJSON deve ter a propriedade com o nome do setor ({', '.join(PROPRIEDADES_NOME)}).")
+        try:
+            partes = [geometria["coordinates"]] if geometria["type"] == "Polygon" else geometria["coordinates"]
+            # Anéis externos e buracos de todas as partes: a regra par-ímpar trata os buracos
+            aneis_feicao = [np.asarray(anel, dtype="float64")[:, :2] for parte in partes for anel in parte if len(anel) >= 3]
+            pontos = np.concatenate(aneis_feicao)
+        except (KeyError, TypeError, ValueError, IndexError):
+            raise ValueError(f"Geometria inválida no setor {propriedades[chave]}: coordenadas ausentes ou mal formadas.")
+        nomes.append(str(propriedades[chave]))
+        aneis.append(aneis_feicao)
+        caixas.append((*pontos.min(axis=0), *pontos.max(axis=0)))
+
+    if not nomes:
+        raise ValueError("O GeoJSON não tem polígonos de setores.")
+    return Limites(nomes, aneis, np.array(caixas))
+
+
+# Função para testar quais pontos estão dentro dos anéis (regra par-ímpar, raio para a direita),
+# vetorizada nos pontos: um passo por aresta
+def pontos_dentro(longitudes, latitudes, aneis):
+    dentro = np.zeros(len(longitudes), dtype=bool)
+    for anel in aneis:
+        x1, y1 = anel[:, 0], anel[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            if ay == by:
+                continue
+            cruza = (ay > latitudes) != (by > latitudes)
+            x_cruzamento = ax + (latitudes - ay) * (bx - ax) / (by - ay)
+            dentro ^= cruza & (longitudes < x_cruzamento)
+    return dentro
+
+
+# Função para atribuir cada ponto ao polígono que o contém; retorna o índice do polígono (-1: fora de todos)
+# Índice espacial: grade uniforme sobre a área dos polígonos; cada polígono só testa os pontos
+# das células que a sua caixa envolvente toca (pontos ordenados por célula, busca por faixas)
+def atribuir_poligonos(latitudes, longitudes, limites):
+    latitudes = np.asarray(latitudes, dtype="float64")
+    longitudes = np.asarray(longitudes, dtype="float64")
+    resultado = np.full(len(latitudes), -1, dtype="int32")
+    lon_min, lat_min = limites.caixas[:, :2].min(axis=0)
+    lon_max, lat_max = limites.caixas[:, 2:].max(axis=0)
+
+    lado = max(int(np.sqrt(len(limites) * CELULAS_POR_POLIGONO)), 1)
+    passo_lon = max((lon_max - lon_min) / lado, 1e-9)
+    passo_lat = max((lat_max - lat_min) / lado, 1e-9)
+    na_area = (longitudes >= lon_min) & (longitudes <= lon_max) & (latitudes >= lat_min) & (latitudes <= lat_max)
+    coluna = ((longitudes - lon_min) / passo_lon).astype("int64").clip(0, lado - 1)
+    linha = ((latitudes - lat_min) / passo_lat).astype("int64").clip(0, lado - 1)
+    celulas = np.where(na_area, linha * lado + coluna, -1)
+    ordem = np.argsort(celulas, kind="stable")
+    celulas_ordenadas = celulas[ordem]
+
+    for poligono, (p_lon_min, p_lat_min, p_lon_max, p_lat_max) in enumerate(limites.caixas):
+        coluna_0, coluna_1 = (int(np.clip((valor - lon_min) / passo_lon, 0, lado - 1)) for valor in (p_lon_min, p_lon_max))
+        linha_0, linha_1 = (int(np.clip((valor - lat_min) / passo_lat, 0, lado - 1)) for valor in (p_lat_min, p_lat_max))
+        # Cada linha de células da caixa é uma faixa contínua dos pontos ordenados
+        faixas = [
+            np.searchsorted(celulas_ordenadas, [linha_grade * lado + coluna_0, linha_grade * lado + coluna_1 + 1])
+            for linha_grade in range(linha_0, linha_1 + 1)
+        ]
+        candidatos = np.concatenate([ordem[inicio:fim] for inicio, fim in faixas])
+        # Só os pontos ainda sem polígono e dentro da caixa envolvente
+        candidatos = candidatos[
+            (resultado[candidatos] < 0)
+            & (longitudes[candidatos] >= p_lon_min) & (longitudes[candidatos] <= p_lon_max)
+            & (latitudes[candidatos] >= p_lat_min) & (latitudes[candidatos] <= p_lat_max)
+        ]
+        if len(candidatos):
+            dentro = pontos_dentro(longitudes[candidatos], latitudes[candidatos], limites.aneis[poligono])
+            resultado[candidatos[dentro]] = poligono
+    return resultado
+
+
+# Função para normalizar os nomes de setor antes da comparação (maiúsculas, sem espaços sobrando)
+def normalizar_nome(valores):
+    return pd.Series(valores, dtype="object").astype(str).str.strip().str.upper().str.split().str.join(" ")
+
+
+# Etapa de junção espacial: acrescenta SETOR_GEO (setor do polígono que contém o ponto) e
+# SETOR_DIVERGENTE (o SETOR registrado não é o do polígono, ou o ponto está fora de todos)
+# Retorna só as duas colunas, no mesmo índice dos dados, para não copiar o conjunto
+def juntar_setores(dados, limites):
+    with etapa("juntar_setores", len(dados)) as registro:
+        poligonos = atribuir_poligonos(dados["LATITUDE"].to_numpy(), dados["LONGITUDE"].to_numpy(), limites)
+        # Código da categoria de cada polígono; o último item (posição -1) é o dos pontos fora de todos
+        nomes = limites.nomes + [FORA_DOS_LIMITES]
+        categorias = pd.Index(list(dict.fromkeys(nomes)))
+        setor_geo = pd.Categorical.from_codes(categorias.get_indexer(nomes)[poligonos], categories=categorias)
+
+        # A comparação é feita entre categorias (poucas), não linha a linha
+        registrado = dados["SETOR"].astype("category")
+        identificadores, _ = pd.factorize(pd.concat([normalizar_nome(categorias), normalizar_nome(registrado.cat.categories)]))
+        id_geo = identificadores[:len(categorias)][setor_geo.codes]
+        id_registrado = np.where(registrado.cat.codes.to_numpy() >= 0, identificadores[len(categorias):][registrado.cat.codes.to_numpy()], -1)
+        resultado = pd.DataFrame({
+            "SETOR_GEO": setor_geo,
+            "SETOR_DIVERGENTE": (id_geo != id_registrado) | (poligonos < 0),
+        }, index=dados.index)
+        registro["linhas_saida"] = int(resultado["SETOR_DIVERGENTE"].sum())
+    return resultado
+
+
+# Função para resumir as divergências: quantidade por (SETOR registrado, SETOR_GEO), da maior para a menor
+def resumo_divergencias(dados, juncao):
+    divergentes = juncao["SETOR_DIVERGENTE"].to_numpy()
+    tabela = pd.DataFrame({
+        "SETOR": dados["SETOR"].astype(str).to_numpy()[divergentes],
+        "SETOR_GEO": juncao["SETOR_GEO"].astype(str).to_numpy()[divergentes],
+    })
+    return tabela.value_counts().rename("QUANTIDADE").reset_index()
@@ -0,0 +1,243 @@
+import branca.colormap as cm
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster, HeatMap
+from jinja2 import Template
+
+from armazem_dados import ArmazemDados
+
+# Centro usado quando não há pontos para exibir (Belo Horizonte)
+CENTRO_PADRAO = [-19.9167, -43.9345]
+
+# Até esta quantidade de pontos o mapa usa marcadores agrupados; acima dela, mapa de calor
+LIMITE_PONTOS_CLUSTER = 20_000
+
+# Casas decimais das coordenadas enviadas ao navegador (5 casas ≈ 1 m)
+CASAS_COORDENADAS = 5
+
+# Casas decimais da grade do mapa de calor (3 casas ≈ 100 m)
+CASAS_MAPA_CALOR = 3
+
+# Formas de célula disponíveis para a agregação em grade
+FORMAS_GRADE = ["quadrado", "hexagono"]
+
+# Quantidade de células por largura de tile do mapa; define o tamanho da célula em cada zoom
+CELULAS_POR_TILE = 8
+
+# Grades já agregadas, por estado de filtro (até 64 MB)
+cache_grades = ArmazemDados(orcamento_bytes=64 * 1024 ** 2)
+
+# Marcador criado no navegador para cada linha [lat, lon, natureza] do agrupamento
+CALLBACK_MARCADOR = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+# Função para calcular o centro do mapa a partir das coordenadas
+def centro_mapa(dados):
+    if dados.empty:
+        return CENTRO_PADRAO
+    return [float(dados["LATITUDE"].mean()), float(dados["LONGITUDE"].mean())]
+
+
+# Função para montar a camada de marcadores agrupados a partir das colunas de coordenadas
+def camada_cluster(dados):
+    latitudes = np.round(dados["LATITUDE"].to_numpy(dtype="float64"), CASAS_COORDENADAS)
+    longitudes = np.round(dados["LONGITUDE"].to_numpy(dtype="float64"), CASAS_COORDENADAS)
+    naturezas = dados["CODIGO_NATUREZA_PRINCIPAL"].astype(str).tolist()
+    pontos = list(zip(latitudes.tolist(), longitudes.tolist(), naturezas))
+    return FastMarkerCluster(pontos, callback=CALLBACK_MARCADOR)
+
+
+# Função para montar o mapa de calor com os pontos somados em uma grade fixa,
+# para que o tamanho do HTML dependa da área coberta e não da quantidade de ocorrências
+def camada_mapa_calor(dados):
+    fator = 10 ** CASAS_MAPA_CALOR
+    celulas = np.column_stack([
+        np.round(dados["LATITUDE"].to_numpy(dtype="float64") * fator),
+        np.round(dados["LONGITUDE"].to_numpy(dtype="float64") * fator),
+    ])
+    celulas, contagens = np.unique(celulas, axis=0, return_counts=True)
+    pesos = contagens / contagens.max()
+    pontos = np.column_stack([celulas / fator, pesos]).tolist()
+    return HeatMap(pontos, radius=12, blur=15)
+
+
+# Função para criar o mapa de ocorrências, escolhendo a camada pela quantidade de pontos
+def criar_mapa(dados, limite_cluster=LIMITE_PONTOS_CLUSTER, zoom_start=12):
+    mapa = folium.Map(location=centro_mapa(dados), zoom_start=zoom_start)
+    if dados.empty:
+        return mapa
+    if len(dados) <= limite_cluster:
+        camada_cluster(dados).add_to(mapa)
+    else:
+        camada_mapa_calor(dados).add_to(mapa)
+    return mapa
+
+
+# Função para escolher o tamanho da célula (em graus) a partir do nível de zoom do mapa
+def tamanho_celula_por_zoom(zoom):
+    return 360 / 2 ** zoom / CELULAS_POR_TILE
+
+
+# Função para calcular o índice (x, y) da célula de cada ponto
+# Hexágonos usam coordenadas axiais (q, r) com o vértice para cima
+def indices_celulas(latitudes, longitudes, tamanho, forma="quadrado"):
+    if forma == "quadrado":
+        return np.floor(longitudes / tamanho).astype("int64"), np.floor(latitudes / tamanho).astype("int64")
+
+    q = (np.sqrt(3) / 3 * longitudes - latitudes / 3) / tamanho
+    r = (2 / 3 * latitudes) / tamanho
+    s = -q - r
+    # Arredondamento cúbico: corrige a coordenada com o maior erro
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    corrige_q = (dq > dr) & (dq > ds)
+    corrige_r = ~corrige_q & (dr > ds)
+    rq = np.where(corrige_q, -rr - rs, rq)
+    rr = np.where(corrige_r, -rq - rs, rr)
+    return rq.astype("int64"), rr.astype("int64")
+
+
+# Função para calcular os vértices [lon, lat] de uma célula da grade
+def vertices_celula(x, y, tamanho, forma="quadrado"):
+    if forma == "quadrado":
+        x0, y0 = x * tamanho, y * tamanho
+        return [[x0, y0], [x0 + tamanho, y0], [x0 + tamanho, y0 + tamanho], [x0, y0 + tamanho], [x0, y0]]
+
+    centro_x = tamanho * np.sqrt(3) * (x + y / 2)
+    centro_y = tamanho * 1.5 * y
+    angulos = np.radians(np.arange(7) * 60 + 30)
+    return np.column_stack([centro_x + tamanho * np.cos(angulos), centro_y + tamanho * np.sin(angulos)]).tolist()
+
+
+# Função para somar as ocorrências por célula da grade, com uma coluna por natureza
+def agregar_em_grade(dados, tamanho, forma="quadrado"):
+    x, y = indices_celulas(
+        dados["LATITUDE"].to_numpy(dtype="float64"),
+        dados["LONGITUDE"].to_numpy(dtype="float64"),
+        tamanho,
+        forma,
+    )
+    naturezas = dados["CODIGO_NATUREZA_PRINCIPAL"].astype("category")
+    chaves = np.column_stack([x, y, naturezas.cat.codes.to_numpy(dtype="int64")])
+    chaves, contagens = np.unique(chaves, axis=0, return_counts=True)
+
+    agregado = pd.DataFrame({
+        "CELULA_X": chaves[:, 0],
+        "CELULA_Y": chaves[:, 1],
+        "CODIGO_NATUREZA_PRINCIPAL": naturezas.cat.categories[chaves[:, 2]],
+        "QUANTIDADE": contagens,
+    })
+    grade = agregado.pivot_table(
+        index=["CELULA_X", "CELULA_Y"], columns="CODIGO_NATUREZA_PRINCIPAL",
+        values="QUANTIDADE", aggfunc="sum", fill_value=0,
+    )
+    grade.columns = [str(coluna) for coluna in grade.columns]
+    grade.insert(0, "TOTAL", grade.sum(axis=1))
+    return grade.reset_index()
+
+
+# Função para obter a grade agregada do cache; chave identifica o conjunto de dados e os filtros aplicados
+def agregar_em_grade_cacheado(chave, dados, zoom, forma="quadrado"):
+    return cache_grades.obter_ou_carregar(
+        (chave, zoom, forma),
+        lambda: agregar_em_grade(dados, tamanho_celula_por_zoom(zoom), forma),
+    )
+
+
+# Função para desenhar a grade agregada como um mapa coroplético
+def camada_grade(grade, tamanho, forma="quadrado"):
+    naturezas = [coluna for coluna in grade.columns if coluna not in ("CELULA_X", "CELULA_Y", "TOTAL")]
+    escala = cm.linear.YlOrRd_09.scale(0, max(int(grade["TOTAL"].max()), 1))
+    escala.caption = "Crimes violentos por célula"
+
+    feicoes = []
+    for registro in grade.to_dict("records"):
+        feicoes.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [vertices_celula(registro["CELULA_X"], registro["CELULA_Y"], tamanho, forma)]},
+            "properties": {"TOTAL": int(registro["TOTAL"]), **{natureza: int(registro[natureza]) for natureza in naturezas}},
+        })
+
+    camada = folium.GeoJson(
+        {"type": "FeatureCollection", "features": feicoes},
+        style_function=lambda feicao: {
+            "fillColor": escala(feicao["properties"]["TOTAL"]),
+            "color": "#555555",
+            "weight": 0.5,
+            "fillOpacity": 0.6,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["TOTAL"] + naturezas),
+    )
+    return camada, escala
+
+
+# Função para criar o mapa com as ocorrências agregadas em grade
+def criar_mapa_grade(dados, chave, zoom=12, forma="quadrado"):
+    mapa = folium.Map(location=centro_mapa(dados), zoom_start=zoom)
+    if dados.empty:
+        return mapa
+    grade = agregar_em_grade_cacheado(chave, dados, zoom, forma)
+    camada, escala = camada_grade(grade, tamanho_celula_por_zoom(zoom), forma)
+    camada.add_to(mapa)
+    escala.add_to(mapa)
+    return mapa
+
+
+# Camada que busca as ocorrências em tiles GeoJSON sob demanda (só os tiles visíveis) e desenha em canvas
+# url: endereço com {z}, {x} e {y}; cada feição é um ponto com a propriedade QUANTIDADE
+class CamadaTiles(MacroElement):
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = new (L.GridLayer.extend({
+            createTile: function (coords, done) {
+                var tile = document.createElement("canvas");
+                var tamanho = this.getTileSize();
+                tile.width = tamanho.x;
+                tile.height = tamanho.y;
+                var mapa = this._map;
+                var url = {{ this.url|tojson }}.replace("{z}", coords.z).replace("{x}", coords.x).replace("{y}", coords.y);
+                fetch(url).then(function (resposta) {
+                    if (!resposta.ok) { throw new Error(resposta.statusText); }
+                    return resposta.json();
+                }).then(function (colecao) {
+                    var contexto = tile.getContext("2d");
+                    var origem = coords.scaleBy(tamanho);
+                    contexto.fillStyle = "rgba(227, 74, 51, 0.6)";
+                    contexto.strokeStyle = "#b30000";
+                    colecao.features.forEach(function (feicao) {
+                        var coordenadas = feicao.geometry.coordinates;
+                        var ponto = mapa.project([coordenadas[1], coordenadas[0]], coords.z).subtract(origem);
+                        var raio = Math.min(3 + 2 * Math.sqrt(feicao.properties.QUANTIDADE), 14);
+                        contexto.beginPath();
+                        contexto.arc(ponto.x, ponto.y, raio, 0, 2 * Math.PI);
+                        contexto.fill();
+                        contexto.stroke();
+                    });
+                    done(null, tile);
+                }).catch(function (erro) { done(erro, tile); });
+                return tile;
+            }
+        }))({maxZoom: 19});
+        {{ this._parent.get_name() }}.addLayer({{ this.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, url):
+        super().__init__()
+        self._name = "CamadaTiles"
+        self.url = url
+
+
+# Função para criar o mapa que carrega as ocorrências por tiles; o HTML não leva nenhum ponto
+def criar_mapa_tiles(centro, url, zoom_start=12):
+    mapa = folium.Map(location=centro, zoom_start=zoom_start)
+    CamadaTiles(url).add_to(mapa)
+    return mapa
@@ -0,0 +1,107 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+# Orçamento dos conjuntos que nenhuma sessão está usando, mantidos para serem reabertos sem recalcular (512 MB)
+ORCAMENTO_OCIOSOS_BYTES = 512 * 1024 ** 2
+
+
+# Referência de uma sessão a um conjunto do registro; o conjunto é o mesmo objeto para todas as sessões
+# (somente leitura, nunca alterado depois de montado). A referência é liberada por liberar()
+# ou quando a sessão termina e o objeto é coletado
+class ReferenciaConjunto:
+    def __init__(self, registro, dataset_id, conjunto):
+        self.dataset_id = dataset_id
+        self.conjunto = conjunto
+        self._finalizador = weakref.finalize(self, registro._liberar, dataset_id)
+
+    @property
+    def ativa(self):
+        return self._finalizador.alive
+
+    # Libera a referência (chamadas repetidas não têm efeito)
+    def liberar(self):
+        self._finalizador()
+
+
+# Registro dos conjuntos de dados compartilhados entre as sessões do servidor, um por conteúdo
+# Conta as referências de cada conjunto: os que estão em uso nunca são descartados; os que ficam
+# sem nenhuma sessão vão para a fila de ociosos e são descartados (LRU) acima do orçamento
+class RegistroConjuntos:
+    def __init__(self, orcamento_ociosos_bytes=ORCAMENTO_OCIOSOS_BYTES):
+        self.orcamento_ociosos_bytes = orcamento_ociosos_bytes
+        self._conjuntos = {}
+        self._referencias = {}
+        self._ociosos = OrderedDict()
+        self._montagens = {}
+        # Reentrante: o finalizador de uma referência pode rodar (coleta de lixo) com a trava já adquirida
+        self._trava = threading.RLock()
+
+    def __contains__(self, dataset_id):
+        with self._trava:
+            return dataset_id in self._conjuntos
+
+    def referencias(self, dataset_id):
+        with self._trava:
+            return self._referencias.get(dataset_id, 0)
+
+    # Retorna uma referência ao conjunto, montando-o com montar() se ainda não estiver no registro
+    # Sessões que pedem o mesmo conjunto ao mesmo tempo esperam uma única montagem
+    # Retorna None se o conjunto não existe e montar não foi informado ou devolveu None
+    def adquirir(self, dataset_id, montar=None):
+        with self._trava:
+            if dataset_id in self._conjuntos:
+                return self._referenciar(dataset_id)
+            if montar is None:
+                return None
+            trava_montagem = self._montagens.setdefault(dataset_id, threading.Lock())
+
+        with trava_montagem:
+            with self._trava:
+                if dataset_id in self._conjuntos:
+                    return self._referenciar(dataset_id)
+            try:
+                conjunto = montar()
+                if conjunto is None:
+                    return None
+                # Publicado antes de a trava de montagem sair do mapa: quem chegar depois encontra o conjunto
+                # no registro ou espera esta trava e confere o registro de novo, sem montar outra vez
+                with self._trava:
+                    self._conjuntos.setdefault(dataset_id, conjunto)
+                    return self._referenciar(dataset_id)
+            finally:
+                with self._trava:
+                    if self._montagens.get(dataset_id) is trava_montagem:
+                        del self._montagens[dataset_id]
+
+    # Resumo para exibição: quantidade de conjuntos, quantos estão em uso e memória ocupada
+    def estatisticas(self):
+        with self._trava:
+            return {
+                "conjuntos": len(self._conjuntos),
+                "em_uso": len(self._referencias),
+                "sessoes": sum(self._referencias.values()),
+                "bytes": sum(conjunto.bytes() for conjunto in self._conjuntos.values()),
+            }
+
+    def _referenciar(self, dataset_id):
+        self._referencias[dataset_id] = self._referencias.get(dataset_id, 0) + 1
+        self._ociosos.pop(dataset_id, None)
+        return ReferenciaConjunto(self, dataset_id, self._conjuntos[dataset_id])
+
+    def _liberar(self, dataset_id):
+        with self._trava:
+            restantes = self._referencias.get(dataset_id, 0) - 1
+            if restantes > 0:
+                self._referencias[dataset_id] = restantes
+                return
+            self._referencias.pop(dataset_id, None)
+            if dataset_id in self._conjuntos:
+                self._ociosos[dataset_id] = self._conjuntos[dataset_id].bytes()
+                self._descartar_ociosos()
+
+    # Descarta os conjuntos ociosos usados há mais tempo até caber no orçamento
+    def _descartar_ociosos(self):
+        while self._ociosos and sum(self._ociosos.values()) > self.orcamento_ociosos_bytes:
+            dataset_id, _ = self._ociosos.popitem(last=False)
+            del self._conjuntos[dataset_id]
@@ -0,0 +1,193 @@
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import quote
+
+import plotly.express as px
+from plotly.offline import get_plotlyjs
+
+from ingestao import ler_csv, ler_varios_csv, PROCESSOS_PADRAO
+from armazem_dados import identificador_conteudo
+from cache_disco import CacheDisco
+from conjunto_dados import ConjuntoDados
+from indices import opcoes, filtrar
+from agregados import contagem_por, serie_diaria
+from series_temporais import figura_serie
+from mapas import criar_mapa
+
+# Colunas que definem as unidades do relatório (um conjunto de arquivos para cada valor)
+COLUNAS_UNIDADES = {"SETOR": "setor", "UNID_REGISTRO_NIVEL_6": "unidade"}
+
+FORMATOS = ["html", "png", "json"]
+
+# Biblioteca do Plotly gravada uma vez na raiz da saída e referenciada pelos HTML das unidades
+ARQUIVO_PLOTLYJS = "plotly.min.js"
+
+# Conjunto de dados de cada processo do pool, recebido uma vez na inicialização
+_conjunto = None
+
+
+# Função para carregar os arquivos (reaproveitando o cache em disco) e montar o conjunto de dados,
+# com índices e cubo calculados uma única vez para todas as unidades
+def carregar_conjunto(caminhos):
+    cache_disco = CacheDisco()
+    ids = []
+    for caminho in caminhos:
+        with open(caminho, "rb") as handle:
+            ids.append(identificador_conteudo(handle.read()))
+    faltantes = [(dataset_id, caminho) for dataset_id, caminho in zip(ids, caminhos) if not cache_disco.contem(dataset_id)]
+    lidos = ler_varios_csv([caminho for _, caminho in faltantes]) if len(faltantes) > 1 else [ler_csv(caminho) for _, caminho in faltantes]
+    for (dataset_id, _), df in zip(faltantes, lidos):
+        cache_disco.guardar(dataset_id, df)
+    return ConjuntoDados.montar([(dataset_id, cache_disco.obter(dataset_id)) for dataset_id in ids])
+
+
+# Função para gerar um nome de arquivo seguro a partir do valor da unidade
+def nome_arquivo(valor):
+    return re.sub(r"[^\w-]+", "_", str(valor)).strip("_") or "sem_nome"
+
+
+# Função para escolher a pasta de cada valor da coluna; valores diferentes que geram o mesmo nome
+# (ex.: "3ª CIA/PM" e "3ª CIA PM", ou só maiúsculas/minúsculas) recebem um sufixo com o hash do valor
+def nomes_pastas(valores):
+    nomes = {valor: nome_arquivo(valor) for valor in valores}
+    repetidos = Counter(nome.lower() for nome in nomes.values())
+    return {
+        valor: f"{nome}_{identificador_conteudo(str(valor))[:8]}" if repetidos[nome.lower()] > 1 else nome
+        for valor, nome in nomes.items()
+    }
+
+
+def _inicializar(conjunto):
+    global _conjunto
+    _conjunto = conjunto
+
+
+# Função para gerar todas as saídas de uma unidade (executada nos processos do pool)
+def gerar_unidade(coluna, valor, pasta, diretorio, formatos):
+    conjunto = _conjunto
+    selecoes = {coluna: [valor]}
+    destino = os.path.join(diretorio, COLUNAS_UNIDADES[coluna], pasta)
+    os.makedirs(destino, exist_ok=True)
+
+    naturezas = contagem_por(conjunto.cubo, "CODIGO_NATUREZA_PRINCIPAL", selecoes)
+    serie = serie_diaria(conjunto.cubo, selecoes)
+    figuras = {
+        "barras_natureza": px.bar(naturezas, x="CODIGO_NATUREZA_PRINCIPAL", y="QUANTIDADE",
+                                  labels={"CODIGO_NATUREZA_PRINCIPAL": "Tipo de Crime", "QUANTIDADE": "Quantidade"}),
+        "pizza_natureza": px.pie(naturezas, names="CODIGO_NATUREZA_PRINCIPAL", values="QUANTIDADE"),
+        "serie": figura_serie(serie)[0],
+    }
+    resumo = {
+        "coluna": coluna,
+        "valor": valor,
+        "total": int(naturezas["QUANTIDADE"].sum()),
+        "naturezas": dict(zip(naturezas["CODIGO_NATUREZA_PRINCIPAL"].astype(str), naturezas["QUANTIDADE"].astype(int).tolist())),
+        "serie": dict(zip(serie["DATA"].dt.strftime("%Y-%m-%d"), serie["QUANTIDADE"].astype(int).tolist())),
+    }
+    if "MES_DESCRICAO" in conjunto.cubo.columns:
+        meses = contagem_por(conjunto.cubo, "MES_DESCRICAO", selecoes)
+        figuras["barras_mes"] = px.bar(meses, x="MES_DESCRICAO", y="QUANTIDADE", labels={"MES_DESCRICAO": "Mês", "QUANTIDADE": "Quantidade"})
+        resumo["meses"] = dict(zip(meses["MES_DESCRICAO"].astype(str), meses["QUANTIDADE"].astype(int).tolist()))
+
+    for nome, figura in figuras.items():
+        if "html" in formatos:
+            # Caminho relativo de destino (coluna/valor/) até a raiz da saída, onde está o plotly.min.js
+            figura.write_html(os.path.join(destino, f"{nome}.html"), include_plotlyjs=f"../../{ARQUIVO_PLOTLYJS}")
+        if "png" in formatos:
+            figura.write_image(os.path.join(destino, f"{nome}.png"))
+        if "json" in formatos:
+            figura.write_json(os.path.join(destino, f"{nome}.json"))
+
+    # O mapa (Folium) só tem saída em HTML
+    if "html" in formatos:
+        criar_mapa(filtrar(conjunto.dados, conjunto.indices, selecoes)).save(os.path.join(destino, "mapa.html"))
+    if "json" in formatos:
+        with open(os.path.join(destino, "resumo.json"), "w", encoding="utf-8") as handle:
+            json.dump(resumo, handle, ensure_ascii=False, indent=2)
+    return {"coluna": coluna, "valor": valor, "total": resumo["total"],
+            "caminho": os.path.relpath(destino, diretorio)}
+
+
+# Função para gerar o índice (HTML e JSON) com links para as unidades
+def gravar_indice(diretorio, unidades):
+    with open(os.path.join(diretorio, "indice.json"), "w", encoding="utf-8") as handle:
+        json.dump(unidades, handle, ensure_ascii=False, indent=2)
+    linhas = ["<html><head><meta charset='utf-8'><title>Relatório de Crimes Violentos</title></head><body>",
+              "<h1>Relatório de Crimes Violentos</h1>"]
+    for coluna, pasta in COLUNAS_UNIDADES.items():
+        linhas.append(f"<h2>{coluna}</h2><ul>")
+        for unidade in unidades:
+            if unidade["coluna"] == coluna:
+                caminho = html.escape(quote(unidade["caminho"].replace(os.sep, "/")))
+                linhas.append(f"<li>{html.escape(str(unidade['valor']))} ({unidade['total']:,} ocorrências): "
+                              f"<a href='{caminho}/barras_natureza.html'>gráficos</a> | <a href='{caminho}/mapa.html'>mapa</a></li>")
+        linhas.append("</ul>")
+    linhas.append("</body></html>")
+    with open(os.path.join(diretorio, "index.html"), "w", encoding="utf-8") as handle:
+        handle.write("\n".join(linhas))
+
+
+# Função para gerar o relatório de todas as unidades em paralelo
+def gerar_relatorio(conjunto, diretorio, formatos=("html", "json"), processos=PROCESSOS_PADRAO, progresso=None):
+    os.makedirs(diretorio, exist_ok=True)
+    if "html" in formatos:
+        with open(os.path.join(diretorio, ARQUIVO_PLOTLYJS), "w", encoding="utf-8") as handle:
+            handle.write(get_plotlyjs())
+
+    tarefas = [
+        (coluna, valor, pasta)
+        for coluna in COLUNAS_UNIDADES if coluna in conjunto.indices
+        for valor, pasta in nomes_pastas(opcoes(conjunto.indices, coluna)).items()
+    ]
+    unidades = []
+    # O conjunto (dados, índices e cubo) é enviado uma vez para cada processo, não a cada unidade
+    with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar, initargs=(conjunto,)) as executor:
+        futuros = [executor.submit(gerar_unidade, coluna, valor, pasta, diretorio, formatos) for coluna, valor, pasta in tarefas]
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            unidades.append(futuro.result())
+            if progresso is not None:
+                progresso(concluidos, len(tarefas))
+
+    unidades.sort(key=lambda unidade: (unidade["coluna"], str(unidade["valor"])))
+    if "html" in formatos:
+        gravar_indice(diretorio, unidades)
+    elif "json" in formatos:
+        with open(os.path.join(diretorio, "indice.json"), "w", encoding="utf-8") as handle:
+            json.dump(unidades, handle, ensure_ascii=False, indent=2)
+    return unidades
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera os gráficos e mapas de cada SETOR e UNID_REGISTRO_NIVEL_6 sem abrir o aplicativo.")
+    parser.add_argument("arquivos", nargs="+", help="Arquivos CSV do SiGOp (um ou mais meses)")
+    parser.add_argument("--saida", default="relatorio")
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=["html", "json"])
+    parser.add_argument("--processos", type=int, default=PROCESSOS_PADRAO)
+    argumentos = parser.parse_args()
+
+    if "png" in argumentos.formatos:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            parser.error("A saída em PNG precisa do pacote kaleido (pip install kaleido).")
+
+    inicio = time.perf_counter()
+    try:
+        conjunto = carregar_conjunto(argumentos.arquivos)
+    except ValueError as erro:
+        print(f"Erro ao carregar os arquivos: {erro}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(conjunto.dados):,} ocorrências carregadas em {time.perf_counter() - inicio:.1f} s")
+
+    unidades = gerar_relatorio(
+        conjunto, argumentos.saida, argumentos.formatos, argumentos.processos,
+        progresso=lambda concluidos, total: print(f"\r{concluidos}/{total} unidades", end="", flush=True),
+    )
+    print(f"\n{len(unidades)} unidades geradas em {argumentos.saida} ({time.perf_counter() - inicio:.1f} s)")
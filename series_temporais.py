@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Quantidade máxima de pontos enviados ao navegador (somando todas as linhas do gráfico)
+LIMITE_PONTOS_SERIE = 2000
+
+# Mínimo de pontos por linha quando o gráfico tem muitas linhas
+MINIMO_PONTOS_LINHA = 100
+
+# Nome da linha que soma os grupos além do máximo de linhas do gráfico
+NOME_OUTROS = "Outros"
+
+# Frequências de reamostragem: rótulo exibido -> regra do pandas (None mantém os dias)
+FREQUENCIAS = {"Dia": None, "Semana": "W-MON", "Mês": "MS"}
+
+# Até quantos dias o intervalo selecionado é mostrado por dia / por semana; acima disso, por mês
+DIAS_MAXIMOS_DIARIO = 366
+DIAS_MAXIMOS_SEMANAL = 3 * 366
+
+
+# Função para escolher a frequência da série a partir do intervalo de datas selecionado
+def escolher_frequencia(inicio, fim):
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days
+    if dias <= DIAS_MAXIMOS_DIARIO:
+        return "Dia"
+    if dias <= DIAS_MAXIMOS_SEMANAL:
+        return "Semana"
+    return "Mês"
+
+
+# Função para somar as contagens diárias por semana ou mês (colunas DATA, QUANTIDADE e, opcionalmente, a de grupo)
+# Por dia a série é mantida como está: só as datas com ocorrências, como no groupby original
+def reamostrar(serie, frequencia, por=None):
+    regra = FREQUENCIAS[frequencia]
+    if regra is None or serie.empty:
+        return serie
+    chaves = [pd.Grouper(key="DATA", freq=regra, label="left", closed="left")]
+    if por is not None:
+        chaves = [por] + chaves
+    reamostrada = serie.groupby(chaves, observed=True)["QUANTIDADE"].sum().reset_index()
+    return reamostrada[list(serie.columns)]
+
+
+# Função para reduzir uma série a no máximo limite pontos preservando a forma (Largest-Triangle-Three-Buckets)
+# Retorna as posições dos pontos mantidos; o primeiro e o último ponto sempre ficam
+def lttb(x, y, limite=LIMITE_PONTOS_SERIE):
+    total = len(x)
+    if limite >= total or limite < 3:
+        return np.arange(total)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+
+    # Os pontos entre o primeiro e o último são divididos em limite - 2 baldes
+    bordas = np.linspace(1, total - 1, limite - 1).astype("int64")
+    escolhidos = np.empty(limite, dtype="int64")
+    escolhidos[0] = 0
+    escolhidos[-1] = total - 1
+    anterior = 0
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        # Média do balde seguinte (no último balde, o ponto final)
+        if balde + 2 < len(bordas):
+            proximo_inicio, proximo_fim = fim, bordas[balde + 2]
+        else:
+            proximo_inicio, proximo_fim = total - 1, total
+        media_x = x[proximo_inicio:proximo_fim].mean()
+        media_y = y[proximo_inicio:proximo_fim].mean()
+        # Ponto do balde que forma o maior triângulo com o ponto anterior e a média seguinte
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[balde + 1] = anterior
+    return escolhidos
+
+
+# Função para reduzir uma série de DATA x QUANTIDADE com o LTTB
+def reduzir(serie, limite=LIMITE_PONTOS_SERIE):
+    if len(serie) <= limite:
+        return serie
+    datas = serie["DATA"].to_numpy().astype("datetime64[s]").astype("int64")
+    return serie.iloc[lttb(datas, serie["QUANTIDADE"].to_numpy(), limite)]
+
+
+# Função para montar o gráfico de linha da série em WebGL (Scattergl), reamostrado e reduzido
+# serie: saída de serie_diaria (DATA, QUANTIDADE e, opcionalmente, a coluna por, uma linha para cada valor)
+def figura_serie(serie, frequencia=None, por=None, limite=LIMITE_PONTOS_SERIE):
+    if frequencia is None:
+        frequencia = escolher_frequencia(serie["DATA"].min(), serie["DATA"].max()) if len(serie) else "Dia"
+    serie = reamostrar(serie, frequencia, por)
+
+    grupos = list(serie.groupby(por, observed=True, sort=True)) if por is not None else [(None, serie)]
+    # Cada linha tem pelo menos MINIMO_PONTOS_LINHA pontos: acima do máximo de linhas, os grupos
+    # com mais ocorrências ganham uma linha cada e os demais são somados em "Outros"
+    maximo_linhas = max(limite // MINIMO_PONTOS_LINHA, 1)
+    if len(grupos) > maximo_linhas:
+        grupos.sort(key=lambda grupo: grupo[1]["QUANTIDADE"].sum(), reverse=True)
+        outros = pd.concat([grupo for _, grupo in grupos[maximo_linhas - 1:]])
+        outros = outros.groupby("DATA", as_index=False)["QUANTIDADE"].sum()
+        grupos = grupos[:maximo_linhas - 1] + [(NOME_OUTROS, outros)]
+    # O limite de pontos é dividido entre as linhas, para o JSON da figura não crescer com o número de grupos
+    limite_linha = max(limite // max(len(grupos), 1), MINIMO_PONTOS_LINHA)
+    linhas = []
+    for nome, grupo in grupos:
+        grupo = reduzir(grupo.sort_values("DATA"), limite_linha)
+        linhas.append(go.Scattergl(
+            x=grupo["DATA"].to_numpy(),
+            y=grupo["QUANTIDADE"].to_numpy(),
+            mode="lines",
+            name=str(nome) if nome is not None else "Crimes",
+        ))
+    # Montar a figura com todas as linhas de uma vez evita revalidar o layout a cada add_trace
+    figura = go.Figure(data=linhas, layout={
+        "xaxis_title": "Data" if frequencia == "Dia" else f"Data ({frequencia.lower()})",
+        "yaxis_title": "Crimes",
+        "showlegend": por is not None,
+    })
+    return figura, frequencia
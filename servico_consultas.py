@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from armazem_dados import ArmazemDados, TAMANHO_IDENTIFICADOR
+from cache_disco import CacheDisco
+from conjunto_dados import ConjuntoDados
+from agregados import DIMENSOES_CUBO, recortar
+from relatorio import carregar_conjunto
+
+PORTA_PADRAO = 8765
+
+# Respostas já calculadas (JSON ou Arrow), por consulta normalizada (até 64 MB)
+ORCAMENTO_RESPOSTAS_BYTES = 64 * 1024 ** 2
+
+# Dimensões que podem ser agrupadas e filtradas (DATA_FATO é filtrada por inicio/fim e agrupada por periodo)
+DIMENSOES_CONSULTA = [coluna for coluna in DIMENSOES_CUBO if coluna != "DATA_FATO"]
+
+# Agrupamento da data: coluna PERIODO com o primeiro dia do período
+PERIODOS = {"dia": None, "semana": "W", "mes": "M", "ano": "Y"}
+
+# Identificador de conjunto válido: hexadecimal com o tamanho do identificador de conteúdo
+PADRAO_IDENTIFICADOR = re.compile(f"[0-9a-f]{{{TAMANHO_IDENTIFICADOR}}}")
+
+FORMATOS_RESPOSTA = {"json": "application/json", "arrow": "application/vnd.apache.arrow.stream"}
+
+
+# Erro de consulta: vira uma resposta HTTP com o status e a mensagem
+class ErroConsulta(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+# Função para contar as ocorrências do cubo agrupadas por dimensões (e período), com filtros e intervalo de datas
+# selecoes: {coluna: lista de valores}; inicio/fim: datas inclusivas (None não filtra); periodo: chave de PERIODOS
+def consultar(cubo, por=(), selecoes=None, inicio=None, fim=None, periodo=None):
+    recorte = recortar(cubo, selecoes or {})
+    if inicio is not None:
+        recorte = recorte[recorte["DATA_FATO"] >= pd.Timestamp(inicio)]
+    if fim is not None:
+        recorte = recorte[recorte["DATA_FATO"] <= pd.Timestamp(fim)]
+
+    chaves = [recorte[coluna] for coluna in por]
+    if periodo is not None:
+        frequencia = PERIODOS[periodo]
+        datas = recorte["DATA_FATO"] if frequencia is None else recorte["DATA_FATO"].dt.to_period(frequencia).dt.start_time
+        chaves.append(datas.rename("PERIODO"))
+    if not chaves:
+        return pd.DataFrame({"QUANTIDADE": [int(recorte["QUANTIDADE"].sum())]})
+
+    contagem = recorte.groupby(chaves, observed=True)["QUANTIDADE"].sum()
+    contagem = contagem[contagem > 0].astype("int64")
+    return contagem.reset_index()
+
+
+# Função para converter o resultado em JSON ou Arrow (IPC stream)
+def serializar(resultado, formato, dataset_id):
+    if formato == "arrow":
+        tabela = pa.Table.from_pandas(resultado, preserve_index=False)
+        saida = pa.BufferOutputStream()
+        with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        return saida.getvalue().to_pybytes()
+    linhas = resultado.copy()
+    if "PERIODO" in linhas.columns:
+        linhas["PERIODO"] = linhas["PERIODO"].dt.strftime("%Y-%m-%d")
+    corpo = {
+        "dataset": dataset_id,
+        "total": int(resultado["QUANTIDADE"].sum()),
+        "linhas": json.loads(linhas.astype({coluna: str for coluna in linhas.columns if coluna != "QUANTIDADE"}).to_json(orient="records")),
+    }
+    return json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+
+
+# Serviço de consultas: conjuntos carregados (por identificador) e cache das respostas
+# Os conjuntos são imutáveis, então as consultas rodam em paralelo sem trava e sem reler o CSV
+class ServicoConsultas:
+    def __init__(self, cache_disco=None, orcamento_respostas_bytes=ORCAMENTO_RESPOSTAS_BYTES):
+        self.cache_disco = cache_disco or CacheDisco()
+        self.conjuntos = ArmazemDados(medir=lambda conjunto: conjunto.bytes())
+        self.respostas = ArmazemDados(orcamento_respostas_bytes, medir=lambda resposta: len(resposta[2]))
+
+    def adicionar(self, conjunto):
+        self.conjuntos.guardar(conjunto.dataset_id, conjunto)
+        return conjunto.dataset_id
+
+    # Retorna o conjunto carregado ou, para um arquivo já processado pelos aplicativos, o do cache em disco
+    def obter_conjunto(self, dataset_id):
+        conjunto = self.conjuntos.obter(dataset_id)
+        if conjunto is None:
+            # O identificador vira nome de arquivo no cache em disco: só hexadecimal, sem caminhos
+            if not PADRAO_IDENTIFICADOR.fullmatch(dataset_id):
+                raise ErroConsulta(400, f"Identificador de conjunto inválido: {dataset_id}")
+            df = self.cache_disco.obter(dataset_id)
+            if df is None:
+                raise ErroConsulta(404, f"Conjunto de dados não encontrado: {dataset_id}")
+            conjunto = self.conjuntos.guardar(dataset_id, ConjuntoDados.de_arquivo(dataset_id, df))
+        return conjunto
+
+    # Resumo dos conjuntos carregados
+    def listar(self):
+        return [{
+            "dataset": conjunto.dataset_id,
+            "ocorrencias": len(conjunto.dados),
+            "inicio": conjunto.cubo["DATA_FATO"].min().strftime("%Y-%m-%d") if len(conjunto.cubo) else None,
+            "fim": conjunto.cubo["DATA_FATO"].max().strftime("%Y-%m-%d") if len(conjunto.cubo) else None,
+            "dimensoes": [coluna for coluna in DIMENSOES_CONSULTA if coluna in conjunto.cubo.columns],
+        } for conjunto in self.conjuntos.valores()]
+
+    # Responde a consulta /contagens; parametros: {nome: lista de valores} (query string)
+    # Retorna (etag, tipo de conteúdo, corpo), do cache quando a mesma consulta já foi respondida
+    def contagens(self, parametros):
+        def unico(nome, padrao=None):
+            valores = parametros.get(nome)
+            return valores[-1] if valores else padrao
+
+        dataset_id = unico("dataset")
+        if not dataset_id:
+            raise ErroConsulta(400, "Informe o conjunto de dados (dataset).")
+        por = [coluna for valor in parametros.get("por", []) for coluna in valor.split(",") if coluna]
+        formato = unico("formato", "json")
+        periodo = unico("periodo")
+        inicio, fim = unico("inicio"), unico("fim")
+        selecoes = {coluna: sorted(parametros[coluna]) for coluna in DIMENSOES_CONSULTA if parametros.get(coluna)}
+
+        invalidas = [coluna for coluna in por if coluna not in DIMENSOES_CONSULTA]
+        if invalidas:
+            raise ErroConsulta(400, f"Dimensões inválidas: {', '.join(invalidas)}. Use: {', '.join(DIMENSOES_CONSULTA)}.")
+        if formato not in FORMATOS_RESPOSTA:
+            raise ErroConsulta(400, f"Formato inválido: {formato}. Use: {', '.join(FORMATOS_RESPOSTA)}.")
+        if periodo is not None and periodo not in PERIODOS:
+            raise ErroConsulta(400, f"Período inválido: {periodo}. Use: {', '.join(PERIODOS)}.")
+        try:
+            inicio = pd.Timestamp(inicio) if inicio else None
+            fim = pd.Timestamp(fim) if fim else None
+        except ValueError:
+            raise ErroConsulta(400, "Datas inválidas: use o formato AAAA-MM-DD.")
+
+        chave = (dataset_id, tuple(por), tuple(sorted((coluna, tuple(valores)) for coluna, valores in selecoes.items())),
+                 str(inicio), str(fim), periodo, formato)
+        resposta = self.respostas.obter(chave)
+        if resposta is None:
+            conjunto = self.obter_conjunto(dataset_id)
+            ausentes = [coluna for coluna in list(por) + list(selecoes) if coluna not in conjunto.cubo.columns]
+            if ausentes:
+                raise ErroConsulta(400, f"O conjunto não tem as colunas: {', '.join(ausentes)}.")
+            corpo = serializar(consultar(conjunto.cubo, por, selecoes, inicio, fim, periodo), formato, dataset_id)
+            etag = hashlib.sha256(corpo).hexdigest()[:TAMANHO_IDENTIFICADOR]
+            resposta = self.respostas.guardar(chave, (etag, FORMATOS_RESPOSTA[formato], corpo))
+        return resposta
+
+
+# Função para criar o servidor HTTP (uma thread por conexão) do serviço
+# Rotas: GET /conjuntos e GET /contagens?dataset=...&por=SETOR,CODIGO_NATUREZA_PRINCIPAL&SETOR=...&inicio=...&fim=...&periodo=mes&formato=json
+def criar_servidor(servico, host="127.0.0.1", porta=PORTA_PADRAO):
+    class Manipulador(BaseHTTPRequestHandler):
+        # HTTP/1.1: a conexão é mantida entre as consultas do mesmo cliente
+        protocol_version = "HTTP/1.1"
+        # Cabeçalho e corpo saem em escritas separadas; sem o Nagle a resposta não espera o ACK do cliente (~40 ms)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            endereco = urlsplit(self.path)
+            try:
+                if endereco.path == "/conjuntos":
+                    corpo = json.dumps(servico.listar(), ensure_ascii=False).encode("utf-8")
+                    self._enviar(200, FORMATOS_RESPOSTA["json"], corpo)
+                elif endereco.path == "/contagens":
+                    etag, tipo, corpo = servico.contagens(parse_qs(endereco.query))
+                    # Resposta condicional: o cliente que já tem esta versão recebe 304, sem corpo
+                    if self.headers.get("If-None-Match") == f'"{etag}"':
+                        self._enviar(304, tipo, b"", etag)
+                    else:
+                        self._enviar(200, tipo, corpo, etag)
+                else:
+                    raise ErroConsulta(404, "Rota não encontrada. Use /conjuntos ou /contagens.")
+            except ErroConsulta as erro:
+                self._enviar_erro(erro.status, str(erro))
+            except Exception as erro:
+                # Qualquer outra falha vira 500: o cliente recebe a resposta e a conexão continua utilizável
+                self._enviar_erro(500, f"Erro interno: {erro}")
+
+        def _enviar_erro(self, status, mensagem):
+            self._enviar(status, FORMATOS_RESPOSTA["json"], json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8"))
+
+        def _enviar(self, status, tipo, corpo, etag=None):
+            self.send_response(status)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+            if etag is not None:
+                self.send_header("ETag", f'"{etag}"')
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        # Sem log por requisição (as consultas são muitas e o log iria para o terminal)
+        def log_message(self, *argumentos):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de consultas de contagens de crimes violentos (JSON ou Arrow).")
+    parser.add_argument("arquivos", nargs="*", help="Arquivos CSV do SiGOp carregados como um conjunto (um ou mais meses)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    argumentos = parser.parse_args()
+
+    servico = ServicoConsultas()
+    if argumentos.arquivos:
+        inicio = time.perf_counter()
+        try:
+            dataset_id = servico.adicionar(carregar_conjunto(argumentos.arquivos))
+        except ValueError as erro:
+            print(f"Erro ao carregar os arquivos: {erro}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Conjunto {dataset_id} carregado em {time.perf_counter() - inicio:.1f} s")
+    servidor = criar_servidor(servico, argumentos.host, argumentos.porta)
+    print(f"Consultas em http://{argumentos.host}:{argumentos.porta}/contagens (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,102 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Quantidade de tarefas processadas ao mesmo tempo (cada usuário não espera pelas cargas dos outros)
+TAREFAS_SIMULTANEAS = 4
+
+# Quantidade de tarefas finalizadas mantidas para consulta
+TAREFAS_MANTIDAS = 100
+
+AGUARDANDO = "aguardando"
+PROCESSANDO = "processando"
+CONCLUIDA = "concluida"
+CANCELADA = "cancelada"
+ERRO = "erro"
+
+
+# Exceção lançada dentro da tarefa quando o cancelamento foi pedido
+class TarefaCancelada(Exception):
+    pass
+
+
+# Estado de uma tarefa em segundo plano: progresso (0 a 1), mensagem, resultado ou erro
+class Tarefa:
+    def __init__(self, identificador):
+        self.identificador = identificador
+        self.estado = AGUARDANDO
+        self.progresso = 0.0
+        self.mensagem = "Aguardando processamento..."
+        self.resultado = None
+        self.erro = None
+        self.criada = time.time()
+        self._cancelamento = threading.Event()
+
+    @property
+    def finalizada(self):
+        return self.estado in (CONCLUIDA, CANCELADA, ERRO)
+
+    def cancelar(self):
+        self._cancelamento.set()
+
+    # Atualiza o progresso; chamada pela própria tarefa, interrompe o trabalho se o cancelamento foi pedido
+    def atualizar(self, progresso=None, mensagem=None):
+        if self._cancelamento.is_set():
+            raise TarefaCancelada()
+        if progresso is not None:
+            self.progresso = min(max(progresso, 0.0), 1.0)
+        if mensagem is not None:
+            self.mensagem = mensagem
+
+
+# Fila local de tarefas executadas em threads; o navegador consulta o estado pelo identificador
+class FilaTarefas:
+    def __init__(self, max_workers=TAREFAS_SIMULTANEAS, manter=TAREFAS_MANTIDAS):
+        self.manter = manter
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarefa")
+        self._tarefas = OrderedDict()
+        self._trava = threading.Lock()
+
+    # Agenda funcao(tarefa, *argumentos) e retorna o identificador da tarefa na hora
+    def enviar(self, funcao, *argumentos):
+        tarefa = Tarefa(uuid.uuid4().hex)
+        with self._trava:
+            self._tarefas[tarefa.identificador] = tarefa
+            self._descartar_antigas()
+        self._executor.submit(self._executar, tarefa, funcao, argumentos)
+        return tarefa.identificador
+
+    def obter(self, identificador):
+        with self._trava:
+            return self._tarefas.get(identificador)
+
+    # Pede o cancelamento; a tarefa para na próxima atualização de progresso
+    def cancelar(self, identificador):
+        tarefa = self.obter(identificador)
+        if tarefa is not None and not tarefa.finalizada:
+            tarefa.cancelar()
+            tarefa.mensagem = "Cancelando..."
+        return tarefa
+
+    def _executar(self, tarefa, funcao, argumentos):
+        try:
+            tarefa.atualizar(0.0, "Processando...")
+            tarefa.estado = PROCESSANDO
+            tarefa.resultado = funcao(tarefa, *argumentos)
+            tarefa.progresso = 1.0
+            tarefa.estado = CONCLUIDA
+        except TarefaCancelada:
+            tarefa.mensagem = "Processamento cancelado."
+            tarefa.estado = CANCELADA
+        except Exception as erro:
+            tarefa.erro = str(erro)
+            tarefa.mensagem = f"Erro: {erro}"
+            tarefa.estado = ERRO
+
+    # Mantém só as tarefas finalizadas mais recentes (as em andamento nunca são descartadas)
+    def _descartar_antigas(self):
+        finalizadas = [identificador for identificador, tarefa in self._tarefas.items() if tarefa.finalizada]
+        for identificador in finalizadas[:max(len(finalizadas) - self.manter, 0)]:
+            del self._tarefas[identificador]
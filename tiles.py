@@ -0,0 +1,139 @@
+import json
+
+import numpy as np
+
+from armazem_dados import ArmazemDados
+from indices import posicoes_filtradas
+from mapas import CASAS_COORDENADAS
+
+# Zoom da chave espacial de cada ponto; tiles até este zoom são uma faixa contínua do índice
+ZOOM_INDICE_TILES = 16
+
+# A partir deste zoom os pontos vão um a um; abaixo dele são somados em células da grade do tile
+ZOOM_PONTOS_INDIVIDUAIS = 15
+
+# Células por lado do tile na simplificação (tile de 256 px: uma célula a cada 8 px)
+CELULAS_POR_LADO_TILE = 32
+
+# Índices espaciais por conjunto de dados e máscaras por estado de filtro (até 128 MB)
+indices_espaciais = ArmazemDados(orcamento_bytes=128 * 1024 ** 2, medir=lambda indice: sum(array.nbytes for array in indice.values()))
+mascaras_selecao = ArmazemDados(orcamento_bytes=128 * 1024 ** 2, medir=lambda mascara: mascara.nbytes)
+
+# Tiles já gerados (JSON em bytes), por conjunto, filtros e coordenadas do tile (até 64 MB)
+cache_tiles = ArmazemDados(orcamento_bytes=64 * 1024 ** 2, medir=len)
+
+
+# Função para converter latitude/longitude em coordenadas de tile (Web Mercator) com a parte fracionária
+def coordenadas_tile(latitudes, longitudes, zoom):
+    n = 2 ** zoom
+    latitudes = np.radians(np.clip(latitudes, -85.0511, 85.0511))
+    x = (longitudes + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2.0 * n
+    return np.clip(x, 0, n - 1e-9), np.clip(y, 0, n - 1e-9)
+
+
+# Função para intercalar os bits de x e y (ordem Z): tiles vizinhos ficam próximos na ordenação
+# e todos os pontos de um tile de zoom menor formam uma faixa contínua de chaves
+def intercalar_bits(x, y):
+    def espalhar(valores):
+        valores = valores.astype("uint64") & 0xFFFFFFFF
+        valores = (valores | (valores << 16)) & 0x0000FFFF0000FFFF
+        valores = (valores | (valores << 8)) & 0x00FF00FF00FF00FF
+        valores = (valores | (valores << 4)) & 0x0F0F0F0F0F0F0F0F
+        valores = (valores | (valores << 2)) & 0x3333333333333333
+        valores = (valores | (valores << 1)) & 0x5555555555555555
+        return valores
+    return espalhar(np.asarray(x)) | (espalhar(np.asarray(y)) << np.uint64(1))
+
+
+# Função para montar o índice espacial: posições das linhas ordenadas pela chave do tile em ZOOM_INDICE_TILES
+def construir_indice_espacial(dados):
+    x, y = coordenadas_tile(
+        dados["LATITUDE"].to_numpy(dtype="float64"), dados["LONGITUDE"].to_numpy(dtype="float64"), ZOOM_INDICE_TILES,
+    )
+    chaves = intercalar_bits(x.astype("int64"), y.astype("int64"))
+    ordem = np.argsort(chaves, kind="stable")
+    if len(ordem) < 2 ** 31:
+        ordem = ordem.astype("int32")
+    return {"ordem": ordem, "chaves": chaves[ordem]}
+
+
+# Função para obter as posições das linhas cujos pontos caem no tile (z, x, y)
+def posicoes_no_tile(dados, indice, z, x, y):
+    deslocamento = 2 * max(ZOOM_INDICE_TILES - z, 0)
+    # Acima do zoom do índice, a busca é feita no tile ancestral e refinada pelas coordenadas
+    ancestral = max(z - ZOOM_INDICE_TILES, 0)
+    primeira = int(intercalar_bits(np.array([x >> ancestral]), np.array([y >> ancestral]))[0]) << deslocamento
+    ultima = primeira + (1 << deslocamento)
+    inicio, fim = np.searchsorted(indice["chaves"], np.array([primeira, ultima], dtype="uint64"))
+    posicoes = indice["ordem"][inicio:fim]
+    if ancestral:
+        tile_x, tile_y = coordenadas_tile(
+            dados["LATITUDE"].to_numpy(dtype="float64")[posicoes], dados["LONGITUDE"].to_numpy(dtype="float64")[posicoes], z,
+        )
+        posicoes = posicoes[(tile_x.astype("int64") == x) & (tile_y.astype("int64") == y)]
+    return posicoes
+
+
+# Função para gerar a chave de cache das seleções (colunas e valores em ordem)
+def chave_selecoes(selecoes):
+    return tuple(sorted((coluna, tuple(sorted(map(str, valores)))) for coluna, valores in selecoes.items() if valores))
+
+
+# Função para montar a máscara (uma posição por linha) das linhas que atendem às seleções; None se nada é filtrado
+def mascara_filtros(conjunto, selecoes):
+    posicoes = posicoes_filtradas(conjunto.indices, selecoes)
+    if posicoes is None:
+        return None
+    mascara = np.zeros(len(conjunto.dados), dtype=bool)
+    mascara[posicoes] = True
+    return mascara
+
+
+# Função para montar as feições GeoJSON do tile: pontos individuais nos zooms altos,
+# pontos somados por célula (na posição média das ocorrências) nos demais
+def feicoes_tile(dados, posicoes, z, x, y):
+    latitudes = dados["LATITUDE"].to_numpy(dtype="float64")[posicoes]
+    longitudes = dados["LONGITUDE"].to_numpy(dtype="float64")[posicoes]
+
+    if z >= ZOOM_PONTOS_INDIVIDUAIS:
+        naturezas = dados["CODIGO_NATUREZA_PRINCIPAL"].to_numpy()[posicoes].astype(str)
+        return [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+             "properties": {"QUANTIDADE": 1, "CODIGO_NATUREZA_PRINCIPAL": natureza}}
+            for lat, lon, natureza in zip(
+                np.round(latitudes, CASAS_COORDENADAS).tolist(), np.round(longitudes, CASAS_COORDENADAS).tolist(), naturezas.tolist(),
+            )
+        ]
+
+    tile_x, tile_y = coordenadas_tile(latitudes, longitudes, z)
+    celula_x = ((tile_x - x) * CELULAS_POR_LADO_TILE).astype("int64").clip(0, CELULAS_POR_LADO_TILE - 1)
+    celula_y = ((tile_y - y) * CELULAS_POR_LADO_TILE).astype("int64").clip(0, CELULAS_POR_LADO_TILE - 1)
+    celulas, grupos, contagens = np.unique(celula_y * CELULAS_POR_LADO_TILE + celula_x, return_inverse=True, return_counts=True)
+    medias_lat = np.bincount(grupos, weights=latitudes, minlength=len(celulas)) / contagens
+    medias_lon = np.bincount(grupos, weights=longitudes, minlength=len(celulas)) / contagens
+    return [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {"QUANTIDADE": quantidade}}
+        for lat, lon, quantidade in zip(
+            np.round(medias_lat, CASAS_COORDENADAS).tolist(), np.round(medias_lon, CASAS_COORDENADAS).tolist(), contagens.tolist(),
+        )
+    ]
+
+
+# Função para gerar o tile (z, x, y) do conjunto de dados com as seleções aplicadas, em GeoJSON (bytes)
+# Índice espacial, máscara dos filtros e o próprio tile ficam em cache
+def gerar_tile(conjunto, selecoes, z, x, y):
+    dataset_id = conjunto.dataset_id
+    chave = chave_selecoes(selecoes)
+
+    def montar():
+        indice = indices_espaciais.obter_ou_carregar(dataset_id, lambda: construir_indice_espacial(conjunto.dados))
+        posicoes = posicoes_no_tile(conjunto.dados, indice, z, x, y)
+        if chave:
+            mascara = mascaras_selecao.obter_ou_carregar((dataset_id, chave), lambda: mascara_filtros(conjunto, selecoes))
+            posicoes = posicoes[mascara[posicoes]]
+        # Posições em ordem crescente: pontos do tile na ordem original das linhas
+        feicoes = feicoes_tile(conjunto.dados, np.sort(posicoes), z, x, y)
+        return json.dumps({"type": "FeatureCollection", "features": feicoes}, separators=(",", ":")).encode("utf-8")
+
+    return cache_tiles.obter_ou_carregar((dataset_id, chave, z, x, y), montar)
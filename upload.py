@@ -0,0 +1,48 @@
+import binascii
+import codecs
+import hashlib
+import io
+
+from armazem_dados import TAMANHO_IDENTIFICADOR
+
+# Quantidade de caracteres base64 decodificados por vez (múltiplo de 4, para não cortar um grupo)
+TAMANHO_PEDACO_BASE64 = 4 * 1024 ** 2
+
+
+# Função para decodificar o conteúdo enviado pelo dcc.Upload ("data:...;base64,<dados>")
+# O base64 é decodificado em pedaços direto para o buffer que vai para o leitor de CSV; no mesmo passo
+# são calculados o identificador do conteúdo e a codificação (UTF-8 se o arquivo inteiro for válido, senão Latin-1)
+# Retorna (buffer, identificador); buffer.name e buffer.encoding ficam preenchidos para a leitura
+def decodificar_upload(conteudo, nome=None):
+    inicio = conteudo.find(",") + 1
+    # Buffer já no tamanho final, para não realocar (e copiar) o arquivo enquanto ele cresce
+    tamanho = (len(conteudo) - inicio) // 4 * 3 - len(conteudo[-2:]) + len(conteudo[-2:].rstrip("="))
+    buffer = io.BytesIO(bytes(max(tamanho, 0)))
+    resumo = hashlib.sha256()
+    validador = codecs.getincrementaldecoder("utf-8")()
+    utf8 = True
+    for posicao in range(inicio, len(conteudo), TAMANHO_PEDACO_BASE64):
+        pedaco = binascii.a2b_base64(conteudo[posicao:posicao + TAMANHO_PEDACO_BASE64])
+        buffer.write(pedaco)
+        resumo.update(pedaco)
+        # Pedaços só com ASCII são sempre válidos, a menos que um caractere tenha ficado pela metade antes
+        if utf8 and (not pedaco.isascii() or validador.getstate()[0]):
+            try:
+                validador.decode(pedaco)
+            except UnicodeDecodeError:
+                utf8 = False
+    if utf8:
+        try:
+            validador.decode(b"", final=True)
+        except UnicodeDecodeError:
+            utf8 = False
+
+    buffer.truncate()
+    cabecalho = buffer.getbuffer()[:len(codecs.BOM_UTF8)].tobytes()
+    buffer.seek(0)
+    buffer.name = nome
+    if not utf8:
+        buffer.encoding = "latin-1"
+    else:
+        buffer.encoding = "utf-8-sig" if cabecalho == codecs.BOM_UTF8 else "utf-8"
+    return buffer, resumo.hexdigest()[:TAMANHO_IDENTIFICADOR]